@@ -1,12 +1,26 @@
 import kubernetes
 import time
-import random
 import logging
 import sys
 import psycopg
 import watttime
 import dotenv
 import os
+import socket
+import math
+import kopf
+from co2_operator.drain import DrainExecutor
+from co2_operator.eviction import EvictionEngine
+from co2_operator.pod_cache import PodCache
+from co2_operator.metric_sink import MetricSink
+from co2_operator.node_state import NodeStateStore
+from co2_operator.database import setup_database
+from co2_operator.moer import MoerProvider, SimulatedMoerProvider, WattTimeMoerProvider
+from co2_operator.reconciler import Reconciler
+from co2_operator.cycle import reconcile
+from co2_operator.planner import HysteresisPlanner
+from co2_operator.sharding import ShardCoordinator
+from co2_operator import metrics
 
 # Konfiguration von Umgebungsvariablen aus .env und .env.local Dateien
 dotenv.load_dotenv()
@@ -38,326 +52,270 @@ db_connection_string = os.getenv("DB_CONNECTION_STRING")
 watttime_api_username = os.getenv("WATTTIME_API_USERNAME")
 watttime_api_password = os.getenv("WATTTIME_API_PASSWORD")
 
-# Platzhalter für die Speicherung der CO2-Emissionswerte der Nodes
-# Notwendig zur Simulation der MOER-Werte, da API-Regionen der WattTime API nicht ausreicht
-node_moer_values = {}
+# Anbieter der CO2-Emissionswerte der Nodes
+# - Auf "simulated" setzen, um die MOER-Werte zu simulieren (API-Regionen der WattTime API reichen nicht aus)
+# - Auf "watttime" setzen, um die MOER-Werte über die WattTime API abzurufen
+moer_provider_name = os.getenv("MOER_PROVIDER", "simulated")
 
-ignored_node_names = os.getenv("IGNORED_NODE_NAMES", "").split(",")
-
-start_time = time.time()
-
-def get_insert_timestamp():
-    """
-    Gibt den aktuellen Zeitstempel im Format "YYYY-MM-DD HH:MM:SS" zurück.
-    """
-    return time.strftime('%Y-%m-%d %H:%M:%S')
-
-def setup_database(db: psycopg.Connection):
-    """
-    Erstellt die benötigte Datenbank und Tabellen für die Speicherung von Node-Informationen und CO2-Emissionswerten.
-    """
-
-    # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
-    cursor = db.cursor()
+# Alternative Adresse der WattTime API, z.B. für einen lokalen Test-Server
+watttime_url_base = os.getenv("WATTTIME_URL_BASE")
 
-    # Löschen und Erstellen der Tabellen
-    cursor.execute("DROP TABLE IF EXISTS node_infos")
-    cursor.execute("CREATE TABLE node_infos (node_name VARCHAR(255), lat FLOAT, lng FLOAT)")
+# Gültigkeitsdauer einer zwischengespeicherten Vorhersage in Sekunden und maximale Anzahl paralleler API-Aufrufe
+moer_forecast_ttl = int(os.getenv("MOER_FORECAST_TTL", "300"))
+moer_max_workers = int(os.getenv("MOER_MAX_WORKERS", "8"))
 
-    cursor.execute("DROP TABLE IF EXISTS node_metric_entries")
-    cursor.execute("DROP TYPE IF EXISTS value_type")
-    cursor.execute("CREATE TYPE value_type AS ENUM ('MOER', 'POWER')")
-    cursor.execute("CREATE TABLE node_metric_entries (node_name VARCHAR(255), value_type value_type, timestamp TIMESTAMP, value FLOAT)")
+ignored_node_names = os.getenv("IGNORED_NODE_NAMES", "").split(",")
 
-    # Commit der Änderungen an der Datenbank
-    db.commit()
+# Maximale Anzahl an Nodes, die gleichzeitig geleert werden
+drain_max_in_flight = int(os.getenv("DRAIN_MAX_IN_FLIGHT", "10"))
 
-def get_node_moer_value(node: kubernetes.client.V1Node, wt_api: watttime.WattTimeForecast, db: psycopg.Connection):
-    """
-    Berechnet die CO2-Emissionsrate für einen Node.
-    """
+# Maximale Wartezeit in Sekunden, bis ein einzelner Node geleert sein muss
+drain_node_timeout = int(os.getenv("DRAIN_NODE_TIMEOUT", "300"))
 
-    lat_lng = get_node_latlng(node, db)
+# Maximale Anzahl an Evakuierungen pro Sekunde (mit kurzzeitiger Überschreitung bis burst) und gleichzeitig laufender Evakuierungen
+eviction_qps = float(os.getenv("EVICTION_QPS", "20"))
+eviction_burst = int(os.getenv("EVICTION_BURST", "40"))
+eviction_max_in_flight = int(os.getenv("EVICTION_MAX_IN_FLIGHT", "20"))
 
-    # Standardmässig wird der MOER-Wert auf 50 simuliert, sofern er noch nicht existiert
-    if not node.metadata.name in node_moer_values:
-        node_moer_values[node.metadata.name] = 50
+# Maximale Anzahl gepufferter Datenbankeinträge und maximales Alter des Puffers in Sekunden,
+# bevor die Einträge auch innerhalb eines Zyklus geschrieben werden
+metric_flush_max_rows = int(os.getenv("METRIC_FLUSH_MAX_ROWS", "10000"))
+metric_flush_max_age = int(os.getenv("METRIC_FLUSH_MAX_AGE", "60"))
 
-    # Bei jedem Abruf wird der MOER-Wert zufällig um 1 oder 2 erhöht oder verringert
-    # Dabei darf er 25-75 nicht überschreiten
-    moer_value = node_moer_values[node.metadata.name] + random.choice([-4, -2, 2, 4])
-    moer_value = max(25, min(75, moer_value))
+# Maximale Anzahl gepufferter Einträge, während die Datenbank nicht erreichbar ist, darüber werden die ältesten verworfen
+metric_buffer_max_rows = int(os.getenv("METRIC_BUFFER_MAX_ROWS", "100000"))
 
-    # Tatsächliche Berechnung des CO2-Emissionswerts (API-Zugriff nicht ausreichend):
-    # region_info = wt_api.region_from_loc(
-    #     signal_type= "co2_moer",
-    #     latitude= lat_lng["lat"],
-    #     longitude= lat_lng["lng"]
-    # )
+# Anzahl der Tage, für die Metriken aufbewahrt werden, bevor ihre Partitionen gelöscht werden
+# Bei 0 werden keine Metriken gelöscht
+metric_retention_days = int(os.getenv("METRIC_RETENTION_DAYS", "0"))
 
-    # forecast = wt_api.get_forecast_json(
-    #     region= region_info["region"],
-    #     signal_type= "co2_moer",
-    #     horizon_hours= 0
-    # )
+# Intervall in Sekunden, in dem die MOER-Werte neu abgerufen und die Nodes neu optimiert werden
+moer_refresh_interval = int(os.getenv("MOER_REFRESH_INTERVAL", "300"))
 
-    # moer_value = forecast["data"][0]["value"]
+# Ruhezeit in Sekunden, die nach einem Node-Ereignis abgewartet wird, um mehrere Ereignisse zusammenzufassen
+reconcile_debounce = int(os.getenv("RECONCILE_DEBOUNCE", "10"))
 
-    # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
-    cursor = db.cursor()
-
-    # Speichern der CO2-Emissionsrate in der Datenbank
-    cursor.execute(
-        "INSERT INTO node_metric_entries (node_name, timestamp, value_type, value) VALUES (%s, %s, 'MOER', %s)",
-        (node.metadata.name, get_insert_timestamp(), moer_value)
-    )
+# Reserve, um die die Anforderungen der Pods bei der Auswahl der Nodes erhöht werden (0.2 = 20%)
+placement_headroom = float(os.getenv("PLACEMENT_HEADROOM", "0.2"))
 
-    # Commit der Änderungen an der Datenbank
-    db.commit()
+# Minimale Anzahl an Nodes, die für die Ausführung von Pods zulässig sind
+placement_min_nodes = int(os.getenv("PLACEMENT_MIN_NODES", "1"))
 
-    return moer_value
+# Zeitraum in Sekunden, über den die MOER-Werte (Vorhersage oder gleitender Mittelwert) verglichen werden
+planner_horizon = int(os.getenv("PLANNER_HORIZON", "3600"))
 
-def get_node_latlng(node: kubernetes.client.V1Node, db: psycopg.Connection):
-    """
-    Ermittelt die geografischen Koordinaten (Breitengrad und Längengrad) eines Nodes.
-    
-    Wenn sie bereits in der Datenbank existieren, werden die dort gespeicherten Werte zurückgegeben.
-    """
+# Mindestdauer in Sekunden, die ein Node nach einem Wechsel zulässig bzw. gesperrt bleibt
+planner_min_dwell = int(os.getenv("PLANNER_MIN_DWELL", "1800"))
 
-    # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
-    cursor = db.cursor()
+# Mindestunterschied der MOER-Werte für einen Wechsel und Kosten des Leerens eines Nodes in MOER-Stunden,
+# die durch die Einsparung über den Horizont ausgeglichen werden müssen
+planner_switch_threshold = float(os.getenv("PLANNER_SWITCH_THRESHOLD", "5"))
+planner_drain_cost = float(os.getenv("PLANNER_DRAIN_COST", "5"))
 
-    # Abrufen der geografischen Koordinaten aus der Datenbank, falls vorhanden
-    node_info = cursor.execute("SELECT lat, lng FROM node_infos WHERE node_name = %s", (node.metadata.name,)).fetchone()
+# Maximale Wartezeit in Sekunden beim Beenden des Operators auf einen laufenden Zyklus,
+# damit die gepufferten Datenbankeinträge vor dem Ablauf der Termination Grace Period geschrieben werden
+shutdown_timeout = int(os.getenv("SHUTDOWN_TIMEOUT", "10"))
 
-    # Wenn die geografischen Koordinaten in der Datenbank vorhanden sind, werden sie zurückgegeben
-    if node_info is not None:
-        return {"lat": node_info[0], "lng": node_info[1]}
+# Port des HTTP-Servers, der die Prometheus-Metriken unter /metrics bereitstellt
+# Bei 0 wird kein Server gestartet
+metrics_port = int(os.getenv("METRICS_PORT", "8000"))
 
-    # Platzhalter für die tatsächliche Ermittlung der geografischen Koordinaten
-    # Die Zahlen enthalten ungefähr den Bereich Europas
-    new_lat_lng = {
-        "lat": random.uniform(34.5, 71.2),
-        "lng": random.uniform(-31.3, 42.0)
-    }
+# Aufteilen der Nodes auf mehrere Replikate, die sich über Lease-Objekte koordinieren
+# Der Leader berechnet den Plan für alle Nodes, jedes Replikat sperrt und leert seinen Anteil
+sharding_enabled = os.getenv("SHARDING_ENABLED", "false").lower() == "true"
 
-    # Speichern der geografischen Koordinaten in der Datenbank
-    cursor.execute("INSERT INTO node_infos (node_name, lat, lng) VALUES (%s, %s, %s)", (node.metadata.name, new_lat_lng["lat"], new_lat_lng["lng"]))
+# Namespace der Leases und des Plans sowie eindeutiger Name dieses Replikats (z.B. der Pod-Name)
+shard_namespace = os.getenv("SHARD_NAMESPACE", "default")
+shard_identity = os.getenv("SHARD_IDENTITY") or socket.gethostname()
 
-    # Commit der Änderungen an der Datenbank
-    db.commit()
+# Gültigkeitsdauer und Erneuerungsintervall der Leases in Sekunden
+shard_lease_duration = int(os.getenv("SHARD_LEASE_DURATION", "15"))
+shard_renew_interval = int(os.getenv("SHARD_RENEW_INTERVAL", "5"))
 
-    return new_lat_lng
+start_time = time.time()
 
-def is_node_running(node_name: str, db: psycopg.Connection):
+def create_moer_provider() -> MoerProvider:
     """
-    Prüft, ob ein Node im Cluster läuft.
-    Platzhalter für die tatsächliche Überprüfung, ob der Node läuft
+    Erstellt den konfigurierten Anbieter für die CO2-Emissionsraten (MOER-Werte) der Nodes.
     """
 
-    # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
-    cursor = db.cursor()
+    if moer_provider_name == "watttime":
+        # Erstellen eines API-Objekts für die Kommunikation mit der WattTime API
+        wt_api = watttime.WattTimeForecast(watttime_api_username, watttime_api_password)
 
-    # Letzte "POWER"-Metrik des Nodes abrufen
-    last_power_metric = cursor.execute("SELECT value FROM node_metric_entries WHERE node_name = %s AND value_type = 'POWER' ORDER BY timestamp DESC LIMIT 1", (node_name,)).fetchone()
+        # Ermöglicht die Verwendung eines lokalen Test-Servers anstelle der echten API
+        if watttime_url_base:
+            wt_api.url_base = watttime_url_base
 
-    # Wenn keine "POWER"-Metrik vorhanden ist, wird eine eingetragen und angenommen, dass der Node läuft
-    if last_power_metric is None:
-        cursor.execute("INSERT INTO node_metric_entries (node_name, timestamp, value_type, value) VALUES (%s, %s, 'POWER', 1)", (node_name, get_insert_timestamp()))
+        # Die Vorhersage muss den gesamten Planungshorizont abdecken
+        return WattTimeMoerProvider(wt_api, forecast_ttl= moer_forecast_ttl, horizon_hours= math.ceil(planner_horizon / 3600), max_workers= moer_max_workers)
 
-        db.commit()
-        return True
-    
-    # Wenn die letzte "POWER"-Metrik größer als 0 ist, wird angenommen, dass der Node läuft
-    return last_power_metric[0] > 0
+    # Standardmässig werden die MOER-Werte simuliert, da die API-Regionen der WattTime API nicht ausreichen
+    return SimulatedMoerProvider()
 
-def start_node(node_name: str, db: psycopg.Connection):
+@kopf.on.login()
+def login(**kwargs):
     """
-    Startet einen Node im Cluster.
-    Platzhalter für den tatsächlichen Node-Startvorgang
+    Meldet kopf mit derselben kubeconfig an, die auch für die Kubernetes API verwendet wird.
     """
 
-    logger.info(f"Starting node {node_name}")
-    
-    # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
-    cursor = db.cursor()
+    # kopf liest den Pfad der kubeconfig aus der Umgebungsvariable KUBECONFIG
+    if os.getenv("KUBE_CONFIG_PATH"):
+        os.environ["KUBECONFIG"] = os.getenv("KUBE_CONFIG_PATH")
 
-    # Eintragen einer "POWER"-Metrik für den Node, um anzuzeigen, dass er läuft
-    cursor.execute("INSERT INTO node_metric_entries (node_name, timestamp, value_type, value) VALUES (%s, %s, 'POWER', 1)", (node_name, get_insert_timestamp()))
+    # Innerhalb des Clusters wird das Service-Account-Token verwendet
+    return kopf.login_with_kubeconfig(**kwargs) or kopf.login_via_client(**kwargs)
 
-    # Commit der Änderungen an der Datenbank
-    db.commit()
-
-def stop_node(node_name: str, db: psycopg.Connection):
+@kopf.on.startup()
+def startup(settings: kopf.OperatorSettings, memo: kopf.Memo, **_):
     """
-    Stoppt einen Node im Cluster.
-    Platzhalter für den tatsächlichen Node-Stoppvorgang
+    Richtet alle Verbindungen ein und startet den Reconciler, der die Optimierungszyklen ausführt.
     """
 
-    logger.info(f"Stopping node {node_name}")
-
-    # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
-    cursor = db.cursor()
+    # Der Operator erstellt keine Kubernetes-Events für die beobachteten Nodes
+    settings.posting.enabled = False
 
-    # Eintragen einer "POWER"-Metrik für den Node, um anzuzeigen, dass er nicht mehr läuft
-    cursor.execute("INSERT INTO node_metric_entries (node_name, timestamp, value_type, value) VALUES (%s, %s, 'POWER', 0)", (node_name, get_insert_timestamp()))
-
-    # Commit der Änderungen an der Datenbank
-    db.commit()
-
-def wait_for_eviction(k8s_api: kubernetes.client.CoreV1Api, node_name: str, timeout= 300):
-    """
-    Wartet auf die Evakuierung aller Pods von einem Node.
-
-    Wenn timeout erreicht wird und noch Pods auf dem Node laufen, wird False zurückgegeben.
-    """
-
-    # Berechnen der Endzeit basierend auf dem Timeout
-    end_time = time.time() + timeout
-
-    # Warten, bis alle Pods vom Node evakuiert sind oder der Timeout erreicht ist
-    while time.time() < end_time:
-        # Abrufen aller Pods, die auf dem Node ausgeführt werden
-        pods: kubernetes.client.V1Pod = k8s_api.list_pod_for_all_namespaces(field_selector= f"spec.nodeName={node_name}").items
-
-        # Wenn keine Pods mehr auf dem Node laufen, wird True zurückgegeben
-        if not pods:
-            return True
-        
-        # Warten für 5 Sekunden, bevor der nächste Versuch unternommen wird
-        time.sleep(5)
-
-    # Timeout erreicht, es laufen noch Pods auf dem Node
-    return False
+    # Erstellen eines API-Objekts für die Kommunikation mit der Kubernetes API
+    # Der Verbindungspool wird so groß gewählt, dass alle parallelen Drain-Vorgänge und Evakuierungen eine eigene Verbindung erhalten
+    k8s_config = kubernetes.client.Configuration.get_default_copy()
+    k8s_config.connection_pool_maxsize = max(k8s_config.connection_pool_maxsize, drain_max_in_flight + eviction_max_in_flight)
+    # Alle Aufrufe und Fehler werden je Methode für die Prometheus-Metriken gezählt
+    memo.k8s_api = metrics.InstrumentedApi(kubernetes.client.CoreV1Api(kubernetes.client.ApiClient(k8s_config)))
+
+    if metrics_port > 0:
+        metrics.start_server(metrics_port)
+        logger.info(f"Serving Prometheus metrics on port {metrics_port}")
+
+    # Starten des Pod-Caches, der alle Pods über einen einzelnen Watch nach Node indiziert
+    memo.pod_cache = PodCache(memo.k8s_api)
+    memo.pod_cache.start()
+
+    # Erstellen einer gemeinsamen, begrenzten Evakuierung für alle Nodes und eines Executors für das parallele Leeren von Nodes
+    memo.eviction_engine = EvictionEngine(memo.k8s_api, qps= eviction_qps, burst= eviction_burst, max_in_flight= eviction_max_in_flight, dry_run= dry_run)
+    memo.drain_executor = DrainExecutor(memo.k8s_api, memo.pod_cache, max_in_flight= drain_max_in_flight, node_timeout= drain_node_timeout, dry_run= dry_run,
+                                        eviction_engine= memo.eviction_engine)
+
+    # Erstellen des Anbieters für die CO2-Emissionswerte der Nodes
+    memo.moer_provider = create_moer_provider()
+
+    # Erstellen des Planers, der häufige Wechsel von Nodes nahe der Auswahlgrenze verhindert
+    memo.planner = HysteresisPlanner(
+        horizon= planner_horizon,
+        min_dwell= planner_min_dwell,
+        switch_threshold= planner_switch_threshold,
+        drain_cost= planner_drain_cost
+    )
 
-def monitor_nodes():
-    """
-    Überwacht die Nodes im Cluster und optimiert sie basierend auf den CO2-Emissionswerten.
-    """
+    db = psycopg.connect(db_connection_string)
 
-    # Erstellen eines API-Objekts für die Kommunikation mit der Kubernetes API
-    k8s_api = kubernetes.client.CoreV1Api()
+    # Einrichten der Datenbank und Tabellen
+    logger.info("Setting up database...")
 
-    # Erstellen eines API-Objekts für die Kommunikation mit der WattTime API
-    wt_api = watttime.WattTimeForecast(watttime_api_username, watttime_api_password)
+    setup_database(db)
 
-    with psycopg.connect(db_connection_string) as db:
+    logger.info("Database setup complete!")
 
-        # Einrichten der Datenbank und Tabellen
-        logger.info("Setting up database...")
+    # Erstellen eines Puffers, der alle Datenbankeinträge eines Zyklus gesammelt schreibt
+    # Der Puffer verwaltet die gemeinsame Datenbankverbindung und baut sie nach einem Verbindungsabbruch neu auf
+    memo.sink = MetricSink(db, max_rows= metric_flush_max_rows, max_age= metric_flush_max_age, max_buffered_rows= metric_buffer_max_rows,
+                           connect= lambda: psycopg.connect(db_connection_string))
 
-        setup_database(db)
+    # Einmaliges Laden der Koordinaten und Betriebszustände aller Nodes in den Speicher
+    memo.state = NodeStateStore.load(db, memo.sink)
 
-        logger.info("Database setup complete!")
+    # Übernehmen der Konfiguration für die Optimierungszyklen
+    memo.dry_run = dry_run
+    memo.ignored_node_names = ignored_node_names
+    memo.simulate_no_operator = simulate_no_operator
+    memo.metric_retention_days = metric_retention_days
+    memo.placement_headroom = placement_headroom
+    memo.placement_min_nodes = placement_min_nodes
 
-        while True:
-            # Abrufen aller Nodes im Cluster
-            nodes: kubernetes.client.V1NodeList = k8s_api.list_node()
+    # Letzter bekannter Bereitschaftszustand der Nodes, um nur bei Änderungen einen Zyklus anzufordern
+    memo.node_readiness = {}
 
-            nodes = [node for node in k8s_api.list_node().items if node.metadata.name not in ignored_node_names]
-
-            # Berechnen der CO2-Emissionswerte für alle Nodes
-            node_moer_values = {node.metadata.name: get_node_moer_value(node, wt_api, db) for node in nodes}
+    # Koordination mit den übrigen Replikaten, Änderungen der Replikate oder ein neuer Plan lösen einen Zyklus aus
+    memo.coordinator = None
+    memo.owned_node_names = None
 
-            if simulate_no_operator:
-                logger.info("Skipping operator simulation...")
+    if sharding_enabled:
+        coordination_api = metrics.InstrumentedApi(kubernetes.client.CoordinationV1Api(memo.k8s_api.api_client))
 
-                # Warten für 5 Minuten (5 * 60 * 1 Sekunde), bevor der nächste Zyklus beginnt
-                # Dies ermöglicht ein sofortiges Beenden der Schleife, wenn das Programm beendet wird, ohne dass auf den "sleep" gewartet wird
-                for _ in range(5 * 60):
-                    time.sleep(1)
-                continue
+        memo.coordinator = ShardCoordinator(
+            coordination_api,
+            memo.k8s_api,
+            shard_namespace,
+            shard_identity,
+            lease_duration= shard_lease_duration,
+            renew_interval= shard_renew_interval,
+            on_change= lambda reason: memo.reconciler.request(reason)
+        )
 
-            # Sortieren der Nodes nach ihren CO2-Emissionswerten
-            sorted_nodes = sorted(node_moer_values.items(), key=lambda item: item[1])
-            
-            logger.info(f"Node emission rates: {node_moer_values}")
+    memo.reconciler = Reconciler(lambda: reconcile(memo), interval= moer_refresh_interval, debounce= reconcile_debounce)
 
-            nodes_half_len = len(sorted_nodes) // 2 + len(sorted_nodes) % 2
+    # Anmelden bei den übrigen Replikaten, bevor der erste Zyklus den eigenen Anteil bestimmt
+    if memo.coordinator is not None:
+        memo.coordinator.start()
 
-            # Auswählen der Nodes, die für die Ausführung von Pods zulässig sind (erste Hälfte der Liste der Nodes)
-            nodes_to_allow = sorted_nodes[:nodes_half_len]
-            
-            # Auswählen der Nodes, die für die Ausführung von Pods nicht zulässig sind (zweite Hälfte der Liste der Nodes)
-            nodes_to_disallow = sorted_nodes[nodes_half_len:]
+    # Starten des Reconcilers, der sofort einen ersten Zyklus ausführt
+    memo.reconciler.start()
 
-            # Sicherstellen, dass mindestens ein Node für die Ausführung von Pods zulässig ist
-            if len(nodes_to_allow) == 0:
-                nodes_to_allow.append(nodes_to_disallow.pop(0))
+@kopf.on.cleanup()
+def cleanup(memo: kopf.Memo, **_):
+    """
+    Beendet den Reconciler und schließt alle Verbindungen.
+    """
 
-            # Schleife über die Nodes, die für die Ausführung von Pods zulässig sind
-            for node_name, _ in nodes_to_allow:
-                logger.info(f"Allowing node {node_name} for pod scheduling")
+    # Abbrechen laufender Evakuierungen und Wecken der auf leere Nodes wartenden Drain-Vorgänge,
+    # damit ein laufender Zyklus nicht bis zum Timeout der Nodes weiterläuft
+    memo.eviction_engine.stop()
+    memo.pod_cache.stop()
 
-                # Starten des Nodes, wenn er nicht ausgeführt wird
-                if not is_node_running(node_name, db):
-                    start_node(node_name, db)
+    if not memo.reconciler.stop(timeout= shutdown_timeout):
+        logger.warning(f"Reconciliation cycle still running after {shutdown_timeout} seconds, shutting down anyway")
 
-                # Sicherstellen, dass der Node für die Ausführung von Pods zulässig ist
-                body = {"spec": {"unschedulable": False}}
+    # Freigeben der Leases, damit die übrigen Replikate die Nodes sofort übernehmen
+    if memo.coordinator is not None:
+        memo.coordinator.stop()
 
-                # Änderungen am Node anwenden
-                k8s_api.patch_node(node_name, body, dry_run= dry_run)
-            
-            # Schleife über die Nodes, die für die Ausführung von Pods nicht zulässig sind
-            for node_name, _ in nodes_to_disallow:
-                logger.info(f"Disallowing node {node_name}")
+    # Schreiben der noch gepufferten Datenbankeinträge vor dem Beenden
+    memo.sink.flush()
+    memo.sink.db.close()
 
-                # Sichern, dass der Node für die Ausführung von Pods nicht zulässig ist
-                body = {"spec": {"unschedulable": True}}
+@kopf.on.event("", "v1", "nodes")
+def node_event(event: dict, name: str, memo: kopf.Memo, **_):
+    """
+    Fordert einen Zyklus an, wenn ein Node hinzukommt, entfernt wird oder seine Bereitschaft ändert.
 
-                # Änderungen am Node anwenden
-                k8s_api.patch_node(node_name, body, dry_run= dry_run)
+    Andere Änderungen (z.B. regelmäßige Statusmeldungen oder eigene Patches) lösen keinen Zyklus aus.
+    """
 
-                # Auflisten aller Pods, die auf dem Node ausgeführt werden
-                pods = k8s_api.list_pod_for_all_namespaces(field_selector= f"spec.nodeName={node_name}")
+    if name in ignored_node_names:
+        return
 
-                # Erstellen einer Evakuierung (Eviction) für jeden Pod auf dem Node
-                for pod in pods.items:
-                    logger.info(f"Evicting pod {pod.metadata.name}")
+    event_type = event["type"]
 
-                    # Erstellen einer Evakuierung für den Pod
-                    eviction_body = kubernetes.client.V1Eviction(
-                        metadata= kubernetes.client.V1ObjectMeta(
-                            name= pod.metadata.name,
-                            namespace= pod.metadata.namespace
-                        )
-                    )
+    if event_type == "DELETED":
+        memo.node_readiness.pop(name, None)
+        memo.reconciler.request(f"node {name} removed")
+        return
 
-                    try:
-                        # Durchführen der Evakuierung
-                        k8s_api.create_namespaced_pod_eviction(
-                            name= pod.metadata.name,
-                            namespace= pod.metadata.namespace,
-                            body= eviction_body,
-                            dry_run= dry_run
-                        )
-                    except kubernetes.client.exceptions.ApiException as e:
-                        # Fehlerbehandlung, falls die Evakuierung fehlschlägt
-                        logger.error(f"Failed to evict pod {pod.metadata.name}: {e}")
+    ready = any(
+        condition.get("type") == "Ready" and condition.get("status") == "True"
+        for condition in event["object"].get("status", {}).get("conditions", [])
+    )
+    previous_ready = memo.node_readiness.get(name)
+    memo.node_readiness[name] = ready
 
-                logger.info(f"Waiting for node {node_name} to be drained...")
+    # Ereignisse der initialen Auflistung werden bereits vom ersten Zyklus abgedeckt
+    if event_type is None or previous_ready == ready:
+        return
 
-                # Warten, bis alle Pods vom Node evakuiert sind
-                if dry_run is not None or wait_for_eviction(k8s_api, node_name):
-                    logger.info(f"Node {node_name} has been drained")
-
-                    # Stoppen des Nodes, wenn er noch ausgeführt wird
-                    if is_node_running(node_name, db):
-                        stop_node(node_name, db)
-
-                    logger.info(f"Node {node_name} has been shut down")
-                else:
-                    # Timeout erreicht, es laufen noch Pods auf dem Node
-                    logger.error(f"Timeout while waiting for node {node_name} to be drained")
-
-            logger.info("Completed CO2-based node optimization cycle...beginning next cycle in 5 minutes...")
-            
-            # Warten für 5 Minuten (5 * 60 * 1 Sekunde), bevor der nächste Zyklus beginnt
-            # Dies ermöglicht ein sofortiges Beenden der Schleife, wenn das Programm beendet wird, ohne dass auf den "sleep" gewartet wird
-            for _ in range(5 * 60):
-                time.sleep(1)
+    if previous_ready is None:
+        memo.reconciler.request(f"node {name} added")
+    else:
+        memo.reconciler.request(f"node {name} became {'Ready' if ready else 'NotReady'}")
 
 if __name__ == '__main__':
-    # Starten des Operators
-    monitor_nodes()
+    # Starten des Operators, der alle Nodes clusterweit beobachtet
+    kopf.run(clusterwide= True, standalone= True)
@@ -0,0 +1,187 @@
+import argparse
+import concurrent.futures
+import logging
+import sys
+import time
+import tracemalloc
+import prometheus_client
+from co2_operator.cycle import reconcile
+from co2_operator.simulation import FakeCoreV1Api, create_simulation, create_sharded_simulation
+
+logger = logging.getLogger(__name__)
+
+# Optionen des simulierten Clusters, dessen Speicher nicht zum Operator gezählt wird
+CLUSTER_OPTIONS = ("pods_per_node", "eviction_latency", "api_latency", "eviction_failure_rate")
+
+def run_sharded_cycle(memos: list):
+    """
+    Führt einen Zyklus aller Replikate aus.
+
+    Wie im Cluster beginnen die übrigen Replikate mit ihrem Anteil, sobald sie den neuen Plan des Leaders
+    beim Erneuern ihrer Leases sehen, während der Leader seinen eigenen Anteil bearbeitet.
+    """
+
+    for memo in memos:
+        memo.coordinator.renew()
+
+    leader = next(memo for memo in memos if memo.coordinator.is_leader())
+    plan = leader.coordinator.current_plan()
+    generation = plan["generation"] if plan is not None else None
+
+    def follow(memo, leader_future: concurrent.futures.Future):
+        while True:
+            leader_done = leader_future.done()
+            memo.coordinator.renew()
+            plan = memo.coordinator.current_plan()
+
+            if plan is not None and plan["generation"] != generation:
+                break
+
+            # Der Leader hat in diesem Zyklus keinen Plan veröffentlicht
+            if leader_done:
+                return
+
+            time.sleep(0.001)
+
+        reconcile(memo)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers= len(memos)) as executor:
+        leader_future = executor.submit(reconcile, leader)
+        futures = [leader_future] + [executor.submit(follow, memo, leader_future) for memo in memos if memo is not leader]
+
+        for future in futures:
+            future.result()
+
+def benchmark_cycles(node_count: int, cycles: int, replicas= 1, interval= 300, **simulation_options) -> dict:
+    """
+    Führt cycles Optimierungszyklen eines simulierten Clusters mit node_count Nodes aus.
+
+    Mit replicas > 1 teilen sich mehrere Replikate die Nodes (siehe co2_operator.sharding), ein Zyklus umfasst
+    dann den Leader und alle übrigen Replikate. Zwischen zwei Zyklen vergehen für den Planer interval Sekunden.
+    Gibt die durchschnittliche Dauer, API-Aufrufe, Patches, Evakuierungen, Datenbank-Roundtrips und Summe der
+    MOER-Werte aller zulässigen Nodes je Zyklus sowie den maximalen Speicherbedarf zurück.
+
+    Der Speicherbedarf umfasst den Aufbau des Operators, z.B. das erste Auflisten aller Pods durch den PodCache,
+    jedoch nicht den simulierten Cluster selbst.
+    """
+
+    cluster_options = {key: simulation_options.pop(key) for key in CLUSTER_OPTIONS if key in simulation_options}
+    k8s_api = FakeCoreV1Api(node_count, **cluster_options)
+
+    tracemalloc.start()
+
+    try:
+        if replicas > 1:
+            memos = create_sharded_simulation(node_count, replicas, k8s_api= k8s_api, **simulation_options)
+        else:
+            memos = [create_simulation(node_count, k8s_api= k8s_api, **simulation_options)]
+    except Exception:
+        tracemalloc.stop()
+        k8s_api.stop()
+        raise
+
+    memo = memos[0]
+
+    try:
+        durations = []
+        fleet_moer = []
+
+        api_calls_before = sum(memo.k8s_api.calls.values())
+        patches_before = memo.k8s_api.calls["patch_node"]
+        evictions_before = memo.k8s_api.calls["create_namespaced_pod_eviction"]
+        round_trips_before = sum(replica.sink.db.round_trips for replica in memos)
+
+        for _ in range(cycles):
+            start = time.perf_counter()
+
+            if replicas > 1:
+                run_sharded_cycle(memos)
+            else:
+                reconcile(memo)
+
+            durations.append(time.perf_counter() - start)
+            fleet_moer.append(prometheus_client.REGISTRY.get_sample_value("co2_operator_fleet_moer"))
+
+            for replica in memos:
+                replica.clock.advance(interval)
+
+        _, peak_memory = tracemalloc.get_traced_memory()
+
+        return {
+            "nodes": node_count,
+            "cycle_seconds": sum(durations) / cycles,
+            "max_cycle_seconds": max(durations),
+            "api_calls": (sum(memo.k8s_api.calls.values()) - api_calls_before) / cycles,
+            "patches": (memo.k8s_api.calls["patch_node"] - patches_before) / cycles,
+            "evictions": (memo.k8s_api.calls["create_namespaced_pod_eviction"] - evictions_before) / cycles,
+            "fleet_moer": sum(fleet_moer) / cycles,
+            "db_round_trips": (sum(replica.sink.db.round_trips for replica in memos) - round_trips_before) / cycles,
+            "peak_memory_mb": peak_memory / 1024 / 1024,
+            "api_calls_by_method": dict(memo.k8s_api.calls)
+        }
+    finally:
+        tracemalloc.stop()
+
+        for replica in memos:
+            replica.eviction_engine.stop()
+
+        memo.k8s_api.stop()
+
+def main(argv= None):
+    """
+    Misst die Optimierungszyklen für verschiedene Clustergrößen und gibt die Ergebnisse als Tabelle aus.
+    """
+
+    parser = argparse.ArgumentParser(description= "Benchmark of the CO2-Operator reconcile cycle against a simulated cluster")
+    parser.add_argument("--nodes", type= int, nargs= "+", default= [10, 100, 1000, 10000], help= "cluster sizes to simulate")
+    parser.add_argument("--cycles", type= int, default= 3, help= "cycles per cluster size")
+    parser.add_argument("--pods-per-node", type= int, default= 10)
+    parser.add_argument("--eviction-latency", type= float, default= 0.0, help= "seconds until an evicted pod is gone")
+    parser.add_argument("--api-latency", type= float, default= 0.0, help= "seconds added to every API call")
+    parser.add_argument("--trace", help= "dataset CSV whose MOER values are replayed, e.g. datasets/test-cluster_with-operator.csv")
+    parser.add_argument("--max-in-flight", type= int, default= 10, help= "nodes drained concurrently")
+    parser.add_argument("--replicas", type= int, default= 1, help= "operator replicas sharing the nodes")
+    parser.add_argument("--eviction-failure-rate", type= float, default= 0.0, help= "share of evictions rejected with 429 like by a PodDisruptionBudget")
+    parser.add_argument("--eviction-qps", type= float, default= 0.0, help= "evictions per second, 0 disables the rate limit")
+    parser.add_argument("--interval", type= int, default= 300, help= "simulated seconds between two cycles")
+    parser.add_argument("--planner-horizon", type= int, default= 3600, help= "seconds over which MOER values are compared")
+    parser.add_argument("--planner-min-dwell", type= int, default= 1800, help= "seconds a node keeps its state after a change")
+    parser.add_argument("--planner-switch-threshold", type= float, default= 5.0, help= "minimum MOER difference for a change")
+    parser.add_argument("--planner-drain-cost", type= float, default= 5.0, help= "cost of draining a node in MOER hours")
+    args = parser.parse_args(argv)
+
+    # Die Meldungen der einzelnen Nodes würden die Messung bei großen Clustern dominieren
+    logging.basicConfig(stream= sys.stdout, level= logging.WARNING)
+
+    print(
+        f"{'nodes':>8} {'cycle s':>10} {'max s':>10} {'api calls':>10} {'patches':>10} {'evictions':>10} "
+        f"{'db trips':>10} {'fleet moer':>10} {'peak MB':>10}"
+    )
+
+    for node_count in args.nodes:
+        result = benchmark_cycles(
+            node_count,
+            args.cycles,
+            replicas= args.replicas,
+            pods_per_node= args.pods_per_node,
+            eviction_latency= args.eviction_latency,
+            api_latency= args.api_latency,
+            trace_path= args.trace,
+            drain_max_in_flight= args.max_in_flight,
+            eviction_failure_rate= args.eviction_failure_rate,
+            eviction_qps= args.eviction_qps,
+            interval= args.interval,
+            planner_horizon= args.planner_horizon,
+            planner_min_dwell= args.planner_min_dwell,
+            planner_switch_threshold= args.planner_switch_threshold,
+            planner_drain_cost= args.planner_drain_cost
+        )
+
+        print(
+            f"{result['nodes']:>8} {result['cycle_seconds']:>10.3f} {result['max_cycle_seconds']:>10.3f} "
+            f"{result['api_calls']:>10.1f} {result['patches']:>10.1f} {result['evictions']:>10.1f} "
+            f"{result['db_round_trips']:>10.1f} {result['fleet_moer']:>10.1f} {result['peak_memory_mb']:>10.1f}"
+        )
+
+if __name__ == '__main__':
+    main()
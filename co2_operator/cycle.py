@@ -0,0 +1,356 @@
+import kubernetes
+import time
+import random
+import logging
+import psycopg
+import kopf
+from co2_operator.drain import DrainExecutor
+from co2_operator.pod_cache import PodCache
+from co2_operator.metric_sink import MetricSink
+from co2_operator.node_state import NodeStateStore
+from co2_operator.database import ensure_partitions, drop_expired_partitions, rollback
+from co2_operator.moer import MoerProvider
+from co2_operator.placement import get_cluster_demand
+from co2_operator.planner import HysteresisPlanner, get_switched_at, get_switched_at_annotations
+from co2_operator.sharding import ShardCoordinator
+from co2_operator import metrics
+
+logger = logging.getLogger(__name__)
+
+def get_insert_timestamp():
+    """
+    Gibt den aktuellen Zeitstempel im Format "YYYY-MM-DD HH:MM:SS" zurück.
+    """
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+def get_node_moer_values(nodes: list[kubernetes.client.V1Node], moer_provider: MoerProvider, state: NodeStateStore, sink: MetricSink):
+    """
+    Berechnet die CO2-Emissionsraten für alle Nodes.
+
+    Nodes, für die kein MOER-Wert ermittelt werden konnte, fehlen im Ergebnis.
+    """
+
+    node_locations = {node.metadata.name: get_node_latlng(node, state) for node in nodes}
+
+    # Abrufen der CO2-Emissionsraten aller Nodes in einem Aufruf
+    moer_values = moer_provider.get_moer_values(node_locations)
+
+    # Puffern der CO2-Emissionsraten für das gesammelte Schreiben in die Datenbank
+    timestamp = get_insert_timestamp()
+
+    for node_name, moer_value in moer_values.items():
+        sink.add_metric(node_name, "MOER", moer_value, timestamp)
+
+    return moer_values
+
+def get_node_latlng(node: kubernetes.client.V1Node, state: NodeStateStore):
+    """
+    Ermittelt die geografischen Koordinaten (Breitengrad und Längengrad) eines Nodes.
+    
+    Wenn sie bereits bekannt sind, werden die im NodeStateStore gespeicherten Werte zurückgegeben.
+    """
+
+    # Abrufen der geografischen Koordinaten aus dem Speicher, falls vorhanden
+    lat_lng = state.get_location(node.metadata.name)
+
+    # Wenn die geografischen Koordinaten bekannt sind, werden sie zurückgegeben
+    if lat_lng is not None:
+        return lat_lng
+
+    # Platzhalter für die tatsächliche Ermittlung der geografischen Koordinaten
+    # Die Zahlen enthalten ungefähr den Bereich Europas
+    new_lat_lng = {
+        "lat": random.uniform(34.5, 71.2),
+        "lng": random.uniform(-31.3, 42.0)
+    }
+
+    # Speichern der geografischen Koordinaten im Speicher und in der Datenbank
+    state.set_location(node.metadata.name, new_lat_lng["lat"], new_lat_lng["lng"])
+
+    return new_lat_lng
+
+def is_node_running(node_name: str, state: NodeStateStore):
+    """
+    Prüft, ob ein Node im Cluster läuft.
+    Platzhalter für die tatsächliche Überprüfung, ob der Node läuft
+    """
+
+    # Letzten bekannten Betriebszustand des Nodes abrufen
+    running = state.is_running(node_name)
+
+    # Wenn kein Betriebszustand bekannt ist, wird einer eingetragen und angenommen, dass der Node läuft
+    if running is None:
+        state.set_running(node_name, True, get_insert_timestamp())
+        return True
+    
+    return running
+
+def start_node(node_name: str, state: NodeStateStore):
+    """
+    Startet einen Node im Cluster.
+    Platzhalter für den tatsächlichen Node-Startvorgang
+    """
+
+    logger.info(f"Starting node {node_name}")
+
+    # Eintragen einer "POWER"-Metrik für den Node, um anzuzeigen, dass er läuft
+    state.set_running(node_name, True, get_insert_timestamp())
+
+def stop_node(node_name: str, state: NodeStateStore):
+    """
+    Stoppt einen Node im Cluster.
+    Platzhalter für den tatsächlichen Node-Stoppvorgang
+    """
+
+    logger.info(f"Stopping node {node_name}")
+
+    # Eintragen einer "POWER"-Metrik für den Node, um anzuzeigen, dass er nicht mehr läuft
+    state.set_running(node_name, False, get_insert_timestamp())
+
+def is_node_ready(node: kubernetes.client.V1Node) -> bool:
+    """
+    Prüft, ob der Node laut seiner "Ready"-Bedingung bereit ist, Pods auszuführen.
+    """
+
+    for condition in (node.status.conditions or []) if node.status else []:
+        if condition.type == "Ready":
+            return condition.status == "True"
+
+    return False
+
+def plan_nodes(memo: kopf.Memo, nodes: list[kubernetes.client.V1Node]):
+    """
+    Berechnet für alle Nodes, ob sie für die Ausführung von Pods zulässig sind.
+
+    Gibt (zulässige Nodes, nicht zulässige Nodes) als Listen von (Node-Name, MOER-Wert) aufsteigend nach MOER-Wert
+    zurück oder None, wenn in diesem Zyklus keine Nodes geändert werden.
+    """
+
+    pod_cache: PodCache = memo.pod_cache
+    moer_provider: MoerProvider = memo.moer_provider
+    sink: MetricSink = memo.sink
+    state: NodeStateStore = memo.state
+    planner: HysteresisPlanner = memo.planner
+
+    # Berechnen der CO2-Emissionswerte für alle Nodes
+    with metrics.PHASE_DURATION.labels("moer_fetch").time():
+        node_moer_values = get_node_moer_values(nodes, moer_provider, state, sink)
+
+        # Abrufen der mittleren vorhergesagten Werte über den Planungshorizont, sofern der Anbieter Vorhersagen liefert
+        forecast_values = moer_provider.get_forecast_values(
+            {node_name: state.get_location(node_name) for node_name in node_moer_values},
+            planner.horizon
+        )
+
+    if memo.simulate_no_operator:
+        logger.info("Skipping operator simulation...")
+
+        # Ohne Operator bleiben alle Nodes zulässig
+        metrics.ALLOWED_NODES.set(len(node_moer_values))
+        metrics.DISALLOWED_NODES.set(0)
+        metrics.FLEET_MOER.set(sum(node_moer_values.values()))
+        return None
+
+    # Nicht bereite Nodes können keine Pods ausführen und werden bei der Auswahl nicht berücksichtigt
+    ready_node_names = {node.metadata.name for node in nodes if is_node_ready(node)}
+
+    selection_start = time.perf_counter()
+
+    # Projizieren der MOER-Werte aller Nodes über den Planungshorizont
+    projected_values = planner.project(node_moer_values, forecast_values)
+
+    # Sortieren der Nodes nach ihren CO2-Emissionswerten
+    sorted_nodes = sorted(
+        [(node_name, moer_value) for node_name, moer_value in node_moer_values.items() if node_name in ready_node_names],
+        key=lambda item: item[1]
+    )
+
+    if not sorted_nodes:
+        logger.info("No ready nodes to optimize")
+        return None
+    
+    logger.info(f"Node emission rates: {node_moer_values}")
+
+    # Ermitteln der Kapazität der Nodes und der Anforderungen aller Pods aus dem Pod-Cache
+    node_capacities, pod_requests = get_cluster_demand(
+        [node for node in nodes if node.metadata.name in ready_node_names],
+        pod_cache.all_pods(),
+        memo.ignored_node_names
+    )
+
+    # Auswählen der über den Horizont günstigsten Nodes, die den aktuellen Bedarf inklusive Reserve decken
+    # Dabei bleiben immer mindestens placement_min_nodes Nodes für die Ausführung von Pods zulässig
+    # Ein Node wechselt seinen Zustand nur, wenn sich der Wechsel trotz der Kosten des Leerens lohnt
+    # Im Dry-Run-Modus ändern sich die Nodes nicht, daher plant der Planer dann auf seinem eigenen Zustand weiter
+    allowed_node_names = set(planner.select(
+        {node_name: projected_values[node_name] for node_name, _ in sorted_nodes},
+        {node.metadata.name: (not node.spec.unschedulable, get_switched_at(node)) for node in nodes},
+        node_capacities,
+        pod_requests,
+        headroom= memo.placement_headroom,
+        min_nodes= memo.placement_min_nodes,
+        use_observed= memo.dry_run is None
+    ))
+
+    # Auswählen der Nodes, die für die Ausführung von Pods zulässig bzw. nicht zulässig sind
+    nodes_to_allow = [(node_name, moer_value) for node_name, moer_value in sorted_nodes if node_name in allowed_node_names]
+    nodes_to_disallow = [(node_name, moer_value) for node_name, moer_value in sorted_nodes if node_name not in allowed_node_names]
+
+    metrics.PHASE_DURATION.labels("selection").observe(time.perf_counter() - selection_start)
+    metrics.ALLOWED_NODES.set(len(nodes_to_allow))
+    metrics.DISALLOWED_NODES.set(len(nodes_to_disallow))
+    metrics.FLEET_MOER.set(sum(moer_value for _, moer_value in nodes_to_allow))
+
+    logger.info(f"Allowing {len(nodes_to_allow)} of {len(sorted_nodes)} nodes for {len(pod_requests)} pods")
+
+    return nodes_to_allow, nodes_to_disallow
+
+@metrics.CYCLE_DURATION.time()
+def reconcile(memo: kopf.Memo):
+    """
+    Führt einen Optimierungszyklus aus, der die Nodes im Cluster basierend auf den CO2-Emissionswerten optimiert.
+
+    Alle Verbindungen und die Konfiguration werden aus memo gelesen, das beim Start des Operators befüllt wird.
+    Mit Sharding (memo.coordinator) berechnet nur der Leader den Plan für alle Nodes, jedes Replikat
+    wendet ihn anschließend auf seinen Anteil der Nodes an.
+    """
+
+    k8s_api: kubernetes.client.CoreV1Api = memo.k8s_api
+    drain_executor: DrainExecutor = memo.drain_executor
+    sink: MetricSink = memo.sink
+    state: NodeStateStore = memo.state
+    coordinator: ShardCoordinator = memo.coordinator
+
+    # Konfiguration des Operators
+    dry_run = memo.dry_run
+    ignored_node_names = memo.ignored_node_names
+
+    # Ohne Sharding berechnet jedes Replikat seinen Plan selbst
+    is_leader = coordinator is None or coordinator.is_leader()
+    metrics.SHARD_LEADER.set(1 if is_leader else 0)
+
+    # Anlegen der Partitionen für die Metriken der nächsten Tage und Löschen abgelaufener Partitionen
+    if is_leader:
+        try:
+            with metrics.PHASE_DURATION.labels("db_maintenance").time(), metrics.count_db("partitions"):
+                # Eine unterbrochene Verbindung wird vom Puffer für alle Komponenten neu aufgebaut
+                db = sink.get_connection()
+                ensure_partitions(db)
+
+                if memo.metric_retention_days > 0:
+                    drop_expired_partitions(db, memo.metric_retention_days)
+        except psycopg.Error as e:
+            # Eine abgebrochene Transaktion würde jede weitere Anweisung auf der Verbindung scheitern lassen,
+            # die Nodes werden trotzdem geplant und die Wartung im nächsten Zyklus wiederholt
+            rollback(sink.db)
+            logger.error(f"Failed to maintain the metric partitions: {e}")
+
+    # Abrufen aller Nodes im Cluster
+    with metrics.PHASE_DURATION.labels("node_list").time():
+        nodes = [node for node in k8s_api.list_node().items if node.metadata.name not in ignored_node_names]
+
+    # Beobachteter Zustand der Nodes, ob sie für die Ausführung von Pods gesperrt sind
+    unschedulable_nodes = {node.metadata.name: bool(node.spec.unschedulable) for node in nodes}
+
+    if is_leader:
+        # Ein erneut gewählter Leader darf keinen Zustand aus seiner früheren Amtszeit verwenden
+        memo.planner.start_term(coordinator.leader_term() if coordinator is not None else 0)
+
+        plan = plan_nodes(memo, nodes)
+
+        if plan is None:
+            # Schreiben aller gepufferten Datenbankeinträge dieses Zyklus
+            sink.flush()
+            return
+
+        nodes_to_allow, nodes_to_disallow = plan
+
+        # Veröffentlichen des Plans für die übrigen Replikate
+        if coordinator is not None:
+            coordinator.publish_plan(nodes_to_allow, nodes_to_disallow)
+    else:
+        plan = coordinator.current_plan()
+
+        if plan is None:
+            logger.info("Waiting for the shard leader to publish a plan")
+
+            sink.flush()
+            return
+
+        # Nodes, die seit der Berechnung des Plans entfernt wurden, werden übersprungen
+        nodes_to_allow = [(node_name, moer_value) for node_name, moer_value in plan["allowed"].items() if node_name in unschedulable_nodes]
+        nodes_to_disallow = [(node_name, moer_value) for node_name, moer_value in plan["disallowed"].items() if node_name in unschedulable_nodes]
+
+        logger.info(f"Applying shard plan {plan['generation']} of leader {plan['leader']}")
+
+    if coordinator is not None:
+        # Auswählen der Nodes, die dieses Replikat bearbeitet
+        owned_node_names = coordinator.owned_nodes(unschedulable_nodes)
+
+        # Der Betriebszustand neu übernommener Nodes wurde bisher von einem anderen Replikat geschrieben
+        if memo.owned_node_names is not None and owned_node_names - memo.owned_node_names:
+            state.reload_power_states(sink.get_connection(), owned_node_names - memo.owned_node_names)
+
+        memo.owned_node_names = owned_node_names
+        metrics.SHARD_OWNED_NODES.set(len(owned_node_names))
+
+        logger.info(f"Handling {len(owned_node_names)} of {len(unschedulable_nodes)} nodes as one of {len(coordinator.members())} replicas")
+
+        nodes_to_allow = [(node_name, moer_value) for node_name, moer_value in nodes_to_allow if node_name in owned_node_names]
+        nodes_to_disallow = [(node_name, moer_value) for node_name, moer_value in nodes_to_disallow if node_name in owned_node_names]
+
+    # Vergleich des gewünschten mit dem beobachteten Zustand, nur geänderte Nodes werden gepatcht
+    skipped_patches = 0
+
+    # Vermerken des Wechsels an jedem gepatchten Node für die Mindestverweildauer des Planers
+    switched_at_annotations = get_switched_at_annotations(memo.planner.clock())
+
+    patch_start = time.perf_counter()
+
+    # Schleife über die Nodes, die für die Ausführung von Pods zulässig sind
+    for node_name, _ in nodes_to_allow:
+        # Starten des Nodes, wenn er nicht ausgeführt wird
+        if not is_node_running(node_name, state):
+            start_node(node_name, state)
+
+        # Der Node ist bereits für die Ausführung von Pods zulässig
+        if not unschedulable_nodes[node_name]:
+            skipped_patches += 1
+            continue
+
+        logger.info(f"Allowing node {node_name} for pod scheduling")
+
+        # Sicherstellen, dass der Node für die Ausführung von Pods zulässig ist
+        body = {"metadata": {"annotations": switched_at_annotations}, "spec": {"unschedulable": False}}
+
+        # Änderungen am Node anwenden
+        k8s_api.patch_node(node_name, body, dry_run= dry_run)
+
+    metrics.PHASE_DURATION.labels("patch").observe(time.perf_counter() - patch_start)
+
+    # Bereits gesperrte Nodes werden nicht erneut gepatcht, verbliebene Pods werden aber weiterhin evakuiert
+    cordoned_node_names = {node_name for node_name, _ in nodes_to_disallow if unschedulable_nodes[node_name]}
+    skipped_patches += len(cordoned_node_names)
+
+    logger.info(f"Skipped {skipped_patches} of {len(nodes_to_allow) + len(nodes_to_disallow)} node patches without state change")
+
+    # Paralleles Sperren, Evakuieren und Leeren der Nodes, die für die Ausführung von Pods nicht zulässig sind
+    drain_results = drain_executor.drain([node_name for node_name, _ in nodes_to_disallow], cordoned_node_names, switched_at_annotations)
+
+    for node_name, _ in nodes_to_disallow:
+        if drain_results[node_name]:
+            logger.info(f"Node {node_name} has been drained")
+
+            # Stoppen des Nodes, wenn er noch ausgeführt wird
+            if is_node_running(node_name, state):
+                stop_node(node_name, state)
+
+            logger.info(f"Node {node_name} has been shut down")
+        else:
+            # Timeout erreicht, es laufen noch Pods auf dem Node
+            logger.error(f"Timeout while waiting for node {node_name} to be drained")
+
+    # Schreiben aller gepufferten Datenbankeinträge dieses Zyklus in einer Transaktion
+    sink.flush()
+
+    logger.info("Completed CO2-based node optimization cycle")
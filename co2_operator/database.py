@@ -0,0 +1,260 @@
+import psycopg
+import psycopg.sql
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Präfix der täglichen Partitionen von node_metric_entries, gefolgt vom Datum im Format YYYYMMDD
+PARTITION_PREFIX = "node_metric_entries_p"
+
+# Schlüssel der Advisory-Sperre, mit der Replikate Änderungen am Schema nacheinander ausführen
+SCHEMA_LOCK_ID = 0x434F32
+
+# Beginn des 5-Minuten-Intervalls eines Eintrags, entspricht rollup_bucket() in metric_sink.py
+ROLLUP_BUCKET_SQL = "date_trunc('hour', timestamp) + floor(date_part('minute', timestamp) / 5) * interval '5 minutes'"
+
+def migration_001_initial_schema(cursor: psycopg.Cursor):
+    """
+    Erstellt die ursprünglichen Tabellen, sofern sie noch nicht existieren.
+    """
+
+    cursor.execute("""
+        DO $$ BEGIN
+            CREATE TYPE value_type AS ENUM ('MOER', 'POWER');
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$
+    """)
+    cursor.execute("CREATE TABLE IF NOT EXISTS node_infos (node_name VARCHAR(255), lat FLOAT, lng FLOAT)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS node_metric_entries (node_name VARCHAR(255), value_type value_type, timestamp TIMESTAMP, value FLOAT)")
+
+def migration_002_partitioned_metrics(cursor: psycopg.Cursor):
+    """
+    Wandelt node_metric_entries in eine nach Tagen partitionierte, indizierte Tabelle um.
+
+    Vorhandene Einträge werden in die neuen Partitionen übernommen.
+    """
+
+    cursor.execute("ALTER TABLE node_metric_entries RENAME TO node_metric_entries_legacy")
+
+    cursor.execute("""
+        CREATE TABLE node_metric_entries (
+            node_name VARCHAR(255),
+            value_type value_type,
+            timestamp TIMESTAMP NOT NULL,
+            value FLOAT
+        ) PARTITION BY RANGE (timestamp)
+    """)
+
+    # Der Index wird von PostgreSQL automatisch auf allen Partitionen angelegt
+    cursor.execute("CREATE INDEX node_metric_entries_lookup_idx ON node_metric_entries (node_name, value_type, timestamp DESC)")
+
+    # Anlegen der Partitionen für den gesamten Zeitraum der vorhandenen Einträge
+    first_timestamp, = cursor.execute("SELECT min(timestamp) FROM node_metric_entries_legacy").fetchone()
+
+    if first_timestamp is not None:
+        create_partitions(cursor, first_timestamp.date(), datetime.date.today())
+
+    cursor.execute("""
+        INSERT INTO node_metric_entries (node_name, value_type, timestamp, value)
+        SELECT node_name, value_type, timestamp, value FROM node_metric_entries_legacy WHERE timestamp IS NOT NULL
+    """)
+
+    cursor.execute("DROP TABLE node_metric_entries_legacy")
+
+def migration_003_metric_rollups(cursor: psycopg.Cursor):
+    """
+    Erstellt die Tabelle der 5-Minuten-Rollups und füllt sie aus den vorhandenen Einträgen.
+
+    Je Node und Intervall werden der letzte MOER-Wert, der zuletzt bekannte POWER-Wert (ohne vorherigen
+    Wert wird 1 angenommen) und deren Produkt gespeichert, wie sie auch normalize_data() berechnet.
+    """
+
+    cursor.execute("""
+        CREATE TABLE node_metric_rollups_5min (
+            bucket TIMESTAMP NOT NULL,
+            node_name VARCHAR(255) NOT NULL,
+            moer FLOAT,
+            power FLOAT NOT NULL,
+            moer_power FLOAT,
+            PRIMARY KEY (bucket, node_name)
+        )
+    """)
+
+    # Für die Suche nach dem letzten früheren POWER-Wert eines Nodes in MetricSink.write_rollups()
+    # und das Laden des letzten POWER-Werts je Node in NodeStateStore
+    cursor.execute("CREATE INDEX node_metric_rollups_5min_node_idx ON node_metric_rollups_5min (node_name, bucket DESC)")
+
+    # Die Lücken zwischen zwei POWER-Werten werden über die Anzahl der bisherigen POWER-Werte je Node gruppiert und aufgefüllt
+    cursor.execute(f"""
+        WITH entries AS (
+            SELECT DISTINCT ON (node_name, bucket, value_type) node_name, value_type, bucket, value
+            FROM (SELECT node_name, value_type, timestamp, value, {ROLLUP_BUCKET_SQL} AS bucket FROM node_metric_entries) AS bucketed
+            ORDER BY node_name, bucket, value_type, timestamp DESC
+        ), buckets AS (
+            SELECT
+                node_name,
+                bucket,
+                max(value) FILTER (WHERE value_type = 'MOER') AS moer,
+                max(value) FILTER (WHERE value_type = 'POWER') AS power,
+                count(max(value) FILTER (WHERE value_type = 'POWER')) OVER (PARTITION BY node_name ORDER BY bucket) AS power_group
+            FROM entries
+            GROUP BY node_name, bucket
+        ), filled AS (
+            SELECT node_name, bucket, moer, coalesce(max(power) OVER (PARTITION BY node_name, power_group), 1) AS power
+            FROM buckets
+        )
+        INSERT INTO node_metric_rollups_5min (bucket, node_name, moer, power, moer_power)
+        SELECT bucket, node_name, moer, power, moer * power FROM filled
+    """)
+
+# Geordnete Liste aller Schema-Migrationen (Version, Funktion)
+# Neue Migrationen werden ausschließlich am Ende angehängt
+MIGRATIONS = [
+    (1, migration_001_initial_schema),
+    (2, migration_002_partitioned_metrics),
+    (3, migration_003_metric_rollups),
+]
+
+def setup_database(db: psycopg.Connection):
+    """
+    Bringt das Datenbankschema auf den aktuellen Stand, ohne vorhandene Daten zu löschen.
+
+    Jede noch nicht ausgeführte Migration wird in einer eigenen Transaktion ausgeführt und in schema_migrations vermerkt.
+    Mehrere gleichzeitig startende Replikate führen die Migrationen unter einer Advisory-Sperre nacheinander aus,
+    die ausgeführten Versionen werden daher erst unter der Sperre gelesen.
+    """
+
+    # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
+    cursor = db.cursor()
+
+    lock_schema(cursor)
+    cursor.execute("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, applied_at TIMESTAMP NOT NULL DEFAULT now())")
+    db.commit()
+
+    for version, migration in MIGRATIONS:
+        try:
+            lock_schema(cursor)
+
+            # Ein anderes Replikat hat die Migration möglicherweise bereits ausgeführt
+            if cursor.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,)).fetchone() is not None:
+                db.commit()
+                continue
+
+            logger.info(f"Applying database migration {version} ({migration.__name__})...")
+
+            migration(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+
+            # Commit der Änderungen an der Datenbank
+            db.commit()
+        except psycopg.Error:
+            db.rollback()
+            raise
+
+    # Sicherstellen, dass die Partitionen für heute und morgen existieren
+    ensure_partitions(db)
+
+def lock_schema(cursor: psycopg.Cursor):
+    """
+    Wartet auf die Sperre für Änderungen am Schema, sie wird am Ende der laufenden Transaktion freigegeben.
+    """
+
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+
+def rollback(db: psycopg.Connection):
+    """
+    Verwirft die laufende Transaktion, damit die Verbindung für weitere Anweisungen verwendet werden kann.
+
+    Ist die Verbindung unterbrochen, schlägt auch das Verwerfen fehl, dieser Fehler wird nur protokolliert.
+    """
+
+    try:
+        db.rollback()
+    except psycopg.Error as e:
+        logger.warning(f"Failed to roll back the database transaction: {e}")
+
+def partition_name(day: datetime.date) -> str:
+    """
+    Gibt den Namen der Partition für einen Tag zurück.
+    """
+
+    return f"{PARTITION_PREFIX}{day.strftime('%Y%m%d')}"
+
+def create_partitions(cursor: psycopg.Cursor, first_day: datetime.date, last_day: datetime.date):
+    """
+    Erstellt die täglichen Partitionen von first_day bis einschließlich last_day, sofern sie noch nicht existieren.
+    """
+
+    day = first_day
+
+    while day <= last_day:
+        cursor.execute(
+            psycopg.sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF node_metric_entries FOR VALUES FROM ({}) TO ({})").format(
+                psycopg.sql.Identifier(partition_name(day)),
+                psycopg.sql.Literal(day.isoformat()),
+                psycopg.sql.Literal((day + datetime.timedelta(days= 1)).isoformat())
+            )
+        )
+
+        day += datetime.timedelta(days= 1)
+
+def ensure_partitions(db: psycopg.Connection, days_ahead= 1):
+    """
+    Stellt sicher, dass die Partitionen für heute und die nächsten days_ahead Tage existieren.
+    """
+
+    today = datetime.date.today()
+
+    cursor = db.cursor()
+
+    # Gleichzeitiges CREATE TABLE IF NOT EXISTS derselben Partition kann in Postgres fehlschlagen
+    lock_schema(cursor)
+    create_partitions(cursor, today, today + datetime.timedelta(days= days_ahead))
+
+    # Commit der Änderungen an der Datenbank
+    db.commit()
+
+def drop_expired_partitions(db: psycopg.Connection, retention_days: int) -> list[str]:
+    """
+    Löscht alle Partitionen von node_metric_entries, deren Einträge älter als retention_days Tage sind.
+
+    Gibt die Namen der gelöschten Partitionen zurück.
+    """
+
+    # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
+    cursor = db.cursor()
+
+    # Erster Tag, dessen Einträge noch aufbewahrt werden
+    cutoff_day = datetime.date.today() - datetime.timedelta(days= retention_days)
+
+    partition_names = [
+        name for name, in cursor.execute("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = 'node_metric_entries'
+        """).fetchall()
+    ]
+
+    dropped_partitions = []
+
+    for name in sorted(partition_names):
+        try:
+            day = datetime.datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+        except ValueError:
+            # Fremde Partitionen werden nicht angetastet
+            continue
+
+        if day < cutoff_day:
+            cursor.execute(psycopg.sql.SQL("DROP TABLE {}").format(psycopg.sql.Identifier(name)))
+            dropped_partitions.append(name)
+
+    # Commit der Änderungen an der Datenbank
+    db.commit()
+
+    if dropped_partitions:
+        logger.info(f"Dropped {len(dropped_partitions)} expired metric partitions: {dropped_partitions}")
+
+    return dropped_partitions
@@ -0,0 +1,111 @@
+import kubernetes
+import logging
+import time
+import concurrent.futures
+from co2_operator.pod_cache import PodCache
+from co2_operator.eviction import EvictionEngine, is_evictable
+from co2_operator import metrics
+
+logger = logging.getLogger(__name__)
+
+class DrainExecutor:
+    """
+    Führt das Sperren (Cordon), Evakuieren und Leeren mehrerer Nodes parallel aus.
+
+    Die Pods der Nodes werden aus dem PodCache gelesen, sodass keine zusätzlichen Abfragen an die Kubernetes API nötig sind.
+    Die Evakuierungen aller Nodes laufen gemeinsam über die EvictionEngine und deren Begrenzung der Aufrufe pro Sekunde.
+    Es werden höchstens max_in_flight Nodes gleichzeitig bearbeitet. Jeder Node hat sein eigenes
+    Timeout, sodass die Dauer eines Zyklus vom langsamsten Node abhängt und nicht von der Summe aller Nodes.
+    """
+
+    def __init__(self, k8s_api: kubernetes.client.CoreV1Api, pod_cache: PodCache, max_in_flight= 10, node_timeout= 300, dry_run= None,
+                 eviction_engine: EvictionEngine = None):
+        self.k8s_api = k8s_api
+        self.pod_cache = pod_cache
+        self.max_in_flight = max(1, max_in_flight)
+        self.node_timeout = node_timeout
+        self.dry_run = dry_run
+        self.eviction_engine = eviction_engine or EvictionEngine(k8s_api, dry_run= dry_run)
+
+    def drain(self, node_names: list[str], cordoned_node_names: set[str] = frozenset(), annotations: dict[str, str] = None) -> dict[str, bool]:
+        """
+        Leert alle übergebenen Nodes parallel.
+
+        Nodes in cordoned_node_names sind bereits gesperrt und werden nicht erneut gepatcht.
+        Beim Sperren werden zusätzlich die übergebenen annotations am Node gesetzt.
+        Gibt für jeden Node zurück, ob er innerhalb seines Timeouts vollständig geleert wurde.
+        """
+
+        if not node_names:
+            return {}
+
+        results = {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers= min(self.max_in_flight, len(node_names)), thread_name_prefix= "drain") as executor:
+            futures = {executor.submit(self.drain_node, node_name, node_name not in cordoned_node_names, annotations): node_name for node_name in node_names}
+
+            # Einsammeln der Ergebnisse in der Reihenfolge, in der die Nodes fertig werden
+            for future in concurrent.futures.as_completed(futures):
+                node_name = futures[future]
+
+                try:
+                    results[node_name] = future.result()
+                except Exception as e:
+                    # Ein fehlgeschlagener Node darf die anderen Nodes nicht blockieren
+                    logger.error(f"Failed to drain node {node_name}: {e}")
+                    results[node_name] = False
+
+        return results
+
+    def drain_node(self, node_name: str, cordon= True, annotations: dict[str, str] = None) -> bool:
+        """
+        Sperrt einen Node, evakuiert alle seine Pods und wartet, bis er leer ist.
+
+        Mit cordon= False wird der Node als bereits gesperrt betrachtet und nicht erneut gepatcht.
+        DaemonSet-, statische und beendete Pods bleiben auf dem Node und verhindern nicht, dass er als leer gilt.
+        """
+
+        deadline = time.monotonic() + self.node_timeout
+
+        if cordon:
+            logger.info(f"Disallowing node {node_name}")
+
+            # Sichern, dass der Node für die Ausführung von Pods nicht zulässig ist
+            body = {"spec": {"unschedulable": True}}
+
+            if annotations:
+                body["metadata"] = {"annotations": annotations}
+
+            # Änderungen am Node anwenden
+            with metrics.PHASE_DURATION.labels("patch").time():
+                self.k8s_api.patch_node(node_name, body, dry_run= self.dry_run)
+
+        # Auflisten aller Pods, die auf dem Node ausgeführt werden und ihn verlassen müssen
+        pods = self.pod_cache.pods_on_node(node_name)
+        evictable_pods = [pod for pod in pods if is_evictable(pod)]
+
+        metrics.EVICTIONS.labels("skipped").inc(len(pods) - len(evictable_pods))
+
+        # Ein bereits leerer Node muss weder evakuiert noch abgewartet werden
+        if not evictable_pods:
+            return True
+
+        # Paralleles Erstellen einer Evakuierung (Eviction) für jeden Pod auf dem Node
+        with metrics.PHASE_DURATION.labels("evict").time():
+            failed_evictions = self.eviction_engine.evict(evictable_pods, timeout= max(0, deadline - time.monotonic()))
+
+        # Ohne angenommene Evakuierung wird der Node bis zum Timeout nicht leer
+        if failed_evictions:
+            logger.error(f"Failed to evict {failed_evictions} of {len(evictable_pods)} pods from node {node_name}")
+            return False
+
+        logger.info(f"Waiting for node {node_name} to be drained...")
+
+        # Im Dry-Run-Modus werden keine Pods entfernt, daher gilt der Node sofort als geleert
+        if self.dry_run is not None:
+            return True
+
+        # Warten, bis alle Pods vom Node evakuiert sind
+        # Der PodCache weckt den Thread, sobald der letzte Pod den Node verlassen hat
+        with metrics.PHASE_DURATION.labels("drain_wait").time():
+            return self.pod_cache.wait_until_empty(node_name, timeout= max(0, deadline - time.monotonic()), ignore= lambda pod: not is_evictable(pod))
@@ -0,0 +1,212 @@
+import kubernetes
+import concurrent.futures
+import threading
+import random
+import time
+import logging
+from co2_operator.placement import is_daemonset_pod, is_pod_finished
+from co2_operator import metrics
+
+logger = logging.getLogger(__name__)
+
+# Annotation statischer Pods, die der Kubelet selbst verwaltet und die sich nicht evakuieren lassen
+MIRROR_POD_ANNOTATION = "kubernetes.io/config.mirror"
+
+def is_mirror_pod(pod: kubernetes.client.V1Pod) -> bool:
+    """
+    Prüft, ob ein Pod ein Spiegel eines statischen Pods ist, der fest an seinen Node gebunden ist.
+    """
+
+    return MIRROR_POD_ANNOTATION in (pod.metadata.annotations or {})
+
+def is_evictable(pod: kubernetes.client.V1Pod) -> bool:
+    """
+    Prüft, ob ein Pod evakuiert werden muss, damit sein Node als leer gilt.
+
+    DaemonSet- und statische Pods werden sofort wieder auf demselben Node erstellt, beendete Pods belegen keine Ressourcen mehr.
+    """
+
+    return not is_daemonset_pod(pod) and not is_mirror_pod(pod) and not is_pod_finished(pod)
+
+class TokenBucket:
+    """
+    Begrenzt die Anzahl der Aufrufe pro Sekunde (rate) über alle Threads hinweg, kurzzeitig sind bis zu burst Aufrufe erlaubt.
+
+    Jeder Aufruf reserviert ein Token und wartet außerhalb der Sperre, bis es verfügbar ist.
+    Bei rate <= 0 ist die Anzahl der Aufrufe nicht begrenzt.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float = None, stopped: threading.Event = None) -> bool:
+        """
+        Wartet, bis ein Token verfügbar ist.
+
+        Gibt False zurück, ohne ein Token zu verbrauchen, wenn das Token erst nach dem Zeitpunkt deadline
+        (time.monotonic()) verfügbar wäre, sowie wenn stopped während des Wartens gesetzt wird.
+        """
+
+        if self.rate <= 0:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            delay = (1 - self._tokens) / self.rate if self._tokens < 1 else 0
+
+            if deadline is not None and now + delay > deadline:
+                return False
+
+            self._tokens -= 1
+
+        if delay <= 0:
+            return True
+
+        if stopped is None:
+            time.sleep(delay)
+            return True
+
+        return not stopped.wait(delay)
+
+class EvictionEngine:
+    """
+    Evakuiert Pods parallel und mit einer clientseitigen Begrenzung der Aufrufe pro Sekunde (qps).
+
+    Abgelehnte Evakuierungen (429, z.B. durch ein PodDisruptionBudget) und Serverfehler (5xx) werden mit
+    exponentiell wachsender, zufällig verteilter Wartezeit wiederholt, bis das Timeout des Nodes erreicht ist.
+    Alle Nodes teilen sich höchstens max_in_flight gleichzeitige Evakuierungen.
+    """
+
+    def __init__(self, k8s_api: kubernetes.client.CoreV1Api, qps= 20.0, burst= 40, max_in_flight= 20, base_backoff= 0.5, max_backoff= 30.0, dry_run= None):
+        self.k8s_api = k8s_api
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.dry_run = dry_run
+
+        self.rate_limiter = TokenBucket(qps, burst)
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers= max(1, max_in_flight), thread_name_prefix= "evict")
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """
+        Bricht laufende Wiederholungen ab und beendet die Threads.
+        """
+
+        self._stopped.set()
+        self._executor.shutdown(wait= False, cancel_futures= True)
+
+    def evict(self, pods: list[kubernetes.client.V1Pod], timeout= 300) -> int:
+        """
+        Evakuiert alle übergebenen Pods parallel und wartet, bis jede Evakuierung angenommen oder endgültig fehlgeschlagen ist.
+
+        Gibt die Anzahl der Pods zurück, die nicht evakuiert werden konnten.
+        """
+
+        deadline = time.monotonic() + timeout
+
+        try:
+            futures = [self._executor.submit(self.evict_pod, pod, deadline) for pod in pods]
+        except RuntimeError:
+            # Nach stop() nimmt der Executor keine Aufgaben mehr an
+            return len(pods)
+
+        failed_pods = 0
+
+        for future in futures:
+            try:
+                if not future.result():
+                    failed_pods += 1
+            except concurrent.futures.CancelledError:
+                # Durch stop() abgebrochene Evakuierungen gelten als fehlgeschlagen
+                failed_pods += 1
+
+        return failed_pods
+
+    def evict_pod(self, pod: kubernetes.client.V1Pod, deadline: float) -> bool:
+        """
+        Erstellt eine Evakuierung (Eviction) für einen Pod und wiederholt sie bei Bedarf bis zum Zeitpunkt deadline.
+
+        Gibt zurück, ob die Evakuierung angenommen wurde oder der Pod bereits entfernt ist.
+        """
+
+        logger.info(f"Evicting pod {pod.metadata.name}")
+
+        # Erstellen einer Evakuierung für den Pod
+        eviction_body = kubernetes.client.V1Eviction(
+            metadata= kubernetes.client.V1ObjectMeta(
+                name= pod.metadata.name,
+                namespace= pod.metadata.namespace
+            )
+        )
+
+        attempt = 0
+
+        while not self._stopped.is_set():
+            # Ohne Token vor dem Timeout des Nodes oder nach stop() wird die Evakuierung aufgegeben
+            if not self.rate_limiter.acquire(deadline, self._stopped):
+                break
+
+            try:
+                # Durchführen der Evakuierung
+                self.k8s_api.create_namespaced_pod_eviction(
+                    name= pod.metadata.name,
+                    namespace= pod.metadata.namespace,
+                    body= eviction_body,
+                    dry_run= self.dry_run
+                )
+
+                metrics.EVICTIONS.labels("evicted").inc()
+                return True
+            except kubernetes.client.exceptions.ApiException as e:
+                # Der Pod wurde bereits entfernt
+                if e.status == 404:
+                    metrics.EVICTIONS.labels("evicted").inc()
+                    return True
+
+                if e.status != 429 and (e.status is None or e.status < 500):
+                    metrics.EVICTIONS.labels("failed").inc()
+                    logger.error(f"Failed to evict pod {pod.metadata.name}: {e}")
+                    return False
+
+                status = e.status
+                delay = self.get_backoff(attempt, e)
+
+            if time.monotonic() + delay >= deadline:
+                break
+
+            metrics.EVICTIONS.labels("retried").inc()
+            logger.info(f"Eviction of pod {pod.metadata.name} was rejected with status {status}, retrying in {delay:.1f}s")
+
+            attempt += 1
+            self._stopped.wait(delay)
+
+        metrics.EVICTIONS.labels("failed").inc()
+        logger.error(f"Gave up evicting pod {pod.metadata.name} after {attempt} retries")
+        return False
+
+    def get_backoff(self, attempt: int, error: kubernetes.client.exceptions.ApiException) -> float:
+        """
+        Gibt die Wartezeit bis zur nächsten Wiederholung zurück.
+
+        Eine vom Server gesetzte Retry-After-Angabe hat Vorrang, sonst wird die Wartezeit zufällig zwischen 0 und
+        einer exponentiell wachsenden Obergrenze gewählt (Full Jitter), damit Wiederholungen nicht gleichzeitig eintreffen.
+        """
+
+        retry_after = (error.headers or {}).get("Retry-After")
+
+        if retry_after is not None:
+            try:
+                return float(retry_after) + random.uniform(0, self.base_backoff)
+            except ValueError:
+                pass
+
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
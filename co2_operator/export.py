@@ -0,0 +1,84 @@
+import argparse
+import csv
+import sys
+import os
+import dotenv
+import psycopg
+
+def export_entries(db: psycopg.Connection, writer, since= None, until= None):
+    """
+    Schreibt die 5-Minuten-Rollups im Format der Rohdaten (node_name, value_type, timestamp, value).
+
+    Je Node und Intervall entsteht ein MOER- und ein POWER-Eintrag zu Beginn des Intervalls, sodass die
+    Ausgabe direkt von datasets/plot.py verarbeitet werden kann.
+    """
+
+    writer.writerow(["node_name", "value_type", "timestamp", "value"])
+
+    # Ein benannter Cursor überträgt die Zeilen blockweise, statt das gesamte Ergebnis zu laden
+    with db.cursor(name= "node_metric_rollups_export") as cursor:
+        cursor.execute("""
+            SELECT bucket, node_name, moer, power FROM node_metric_rollups_5min
+            WHERE bucket >= coalesce(%s::timestamp, '-infinity') AND bucket < coalesce(%s::timestamp, 'infinity')
+            ORDER BY bucket, node_name
+        """, (since, until))
+
+        for bucket, node_name, moer, power in cursor:
+            timestamp = bucket.strftime('%Y-%m-%d %H:%M:%S')
+
+            if moer is not None:
+                writer.writerow([node_name, "MOER", timestamp, moer])
+
+            writer.writerow([node_name, "POWER", timestamp, power])
+
+def export_totals(db: psycopg.Connection, writer, since= None, until= None):
+    """
+    Schreibt die CO2-Emissionen aller Nodes je 5-Minuten-Intervall wie normalize_data() sie berechnet
+    (relative_time_5min, total_moer, cumulative_total_moer).
+    """
+
+    writer.writerow(["relative_time_5min", "total_moer", "cumulative_total_moer"])
+
+    rows = db.execute("""
+        SELECT bucket, sum(moer_power) FROM node_metric_rollups_5min
+        WHERE moer IS NOT NULL AND bucket >= coalesce(%s::timestamp, '-infinity') AND bucket < coalesce(%s::timestamp, 'infinity')
+        GROUP BY bucket
+        ORDER BY bucket
+    """, (since, until)).fetchall()
+
+    cumulative_total_moer = 0.0
+
+    for bucket, total_moer in rows:
+        cumulative_total_moer += total_moer
+        relative_time_5min = (bucket - rows[0][0]).total_seconds() / 60
+
+        writer.writerow([relative_time_5min, total_moer, cumulative_total_moer])
+
+def main(argv= None):
+    """
+    Exportiert die 5-Minuten-Rollups aus node_metric_rollups_5min als CSV-Datei.
+    """
+
+    parser = argparse.ArgumentParser(description= "Export of the 5-minute metric rollups of the CO2-Operator")
+    parser.add_argument("--format", choices= ["entries", "totals"], default= "entries", help= "raw-compatible entries for datasets/plot.py or per-bucket totals")
+    parser.add_argument("--since", help= "first bucket to export, e.g. 2024-07-01")
+    parser.add_argument("--until", help= "end of the export (exclusive), e.g. 2024-07-08")
+    parser.add_argument("--output", help= "CSV file to write, defaults to stdout")
+    args = parser.parse_args(argv)
+
+    # Konfiguration von Umgebungsvariablen aus .env und .env.local Dateien
+    dotenv.load_dotenv()
+    if dotenv.find_dotenv(".env.local"):
+        dotenv.load_dotenv(".env.local")
+
+    export = export_entries if args.format == "entries" else export_totals
+
+    with psycopg.connect(os.getenv("DB_CONNECTION_STRING")) as db:
+        if args.output:
+            with open(args.output, "w", newline= "") as file:
+                export(db, csv.writer(file), args.since, args.until)
+        else:
+            export(db, csv.writer(sys.stdout), args.since, args.until)
+
+if __name__ == '__main__':
+    main()
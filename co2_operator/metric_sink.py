@@ -0,0 +1,218 @@
+import psycopg
+import time
+import datetime
+import functools
+import logging
+from co2_operator.database import rollback
+from co2_operator import metrics
+
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize= 1024)
+def rollup_bucket(timestamp: str) -> datetime.datetime:
+    """
+    Gibt den Beginn des 5-Minuten-Intervalls eines Zeitstempels im Format "YYYY-MM-DD HH:MM:SS" zurück.
+
+    Alle Einträge eines Zyklus teilen sich wenige Zeitstempel, daher wird das Ergebnis zwischengespeichert.
+    """
+
+    value = datetime.datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+
+    return value.replace(minute= value.minute - value.minute % 5, second= 0)
+
+def get_rollup_rows(metric_rows: list[tuple]) -> list[tuple]:
+    """
+    Fasst Einträge (node_name, value_type, timestamp, value) zu Zeilen (bucket, node_name, moer, power) zusammen.
+
+    Je Node und Intervall gilt der letzte Wert. Intervalle ohne POWER-Wert übernehmen den Wert eines früheren
+    Intervalls derselben Einträge. Ist keiner bekannt, bleibt power leer und wird beim Schreiben aus
+    node_metric_rollups_5min ergänzt, da POWER-Werte auch von anderen Replikaten geschrieben werden.
+    """
+
+    # Letzter MOER- und POWER-Wert je Intervall und Node
+    buckets = {}
+
+    for node_name, value_type, timestamp, value in sorted(metric_rows, key= lambda row: row[2]):
+        values = buckets.setdefault((rollup_bucket(timestamp), node_name), [None, None])
+        values[0 if value_type == "MOER" else 1] = value
+
+    power_values = {}
+    rows = []
+
+    # Chronologisch, damit POWER-Werte an spätere Intervalle weitergegeben werden
+    for (bucket, node_name), (moer, power) in sorted(buckets.items()):
+        if power is None:
+            power = power_values.get(node_name)
+        else:
+            power_values[node_name] = power
+
+        rows.append((bucket, node_name, moer, power))
+
+    return rows
+
+class MetricSink:
+    """
+    Puffert alle Einträge für node_metric_entries und node_infos, die während eines Zyklus entstehen.
+
+    Die Einträge werden gesammelt und per COPY in einer einzigen Transaktion geschrieben, entweder am Ende
+    eines Zyklus oder sobald max_rows Einträge bzw. max_age Sekunden seit dem letzten Schreiben erreicht sind.
+    In derselben Transaktion werden die betroffenen Intervalle von node_metric_rollups_5min aktualisiert.
+
+    Nach einem fehlgeschlagenen Schreiben wird höchstens alle max_age Sekunden erneut geschrieben. Wächst der
+    Puffer währenddessen über max_buffered_rows Einträge, werden die ältesten Einträge verworfen.
+    Ist die Verbindung geschlossen oder unterbrochen, wird mit connect eine neue Verbindung aufgebaut.
+    """
+
+    def __init__(self, db: psycopg.Connection, max_rows= 10000, max_age= 60, max_buffered_rows= None, connect= None):
+        self.db = db
+        self.connect = connect
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.max_buffered_rows = max_buffered_rows or 10 * max_rows
+
+        # Gepufferte Zeilen in der Spaltenreihenfolge der jeweiligen COPY-Anweisung
+        self.metric_rows: list[tuple] = []
+        self.node_info_rows: list[tuple] = []
+
+        self.last_flush_time = time.monotonic()
+
+        # Gibt an, ob das letzte Schreiben fehlgeschlagen ist
+        self.failed = False
+
+    def add_metric(self, node_name: str, value_type: str, value: float, timestamp: str):
+        """
+        Puffert einen Eintrag für node_metric_entries.
+        """
+
+        self.metric_rows.append((node_name, value_type, timestamp, value))
+        self.flush_if_needed()
+
+    def add_node_info(self, node_name: str, lat: float, lng: float):
+        """
+        Puffert einen Eintrag für node_infos.
+        """
+
+        self.node_info_rows.append((node_name, lat, lng))
+        self.flush_if_needed()
+
+    def flush_if_needed(self):
+        """
+        Schreibt die gepufferten Einträge, wenn die Größen- oder Zeitgrenze erreicht ist.
+
+        Nach einem Fehler gilt nur die Zeitgrenze, damit nicht jeder neue Eintrag den gesamten Puffer erneut sendet.
+        """
+
+        buffered_rows = len(self.metric_rows) + len(self.node_info_rows)
+
+        if buffered_rows > self.max_buffered_rows:
+            self.drop_oldest_rows(buffered_rows - self.max_buffered_rows)
+
+        if time.monotonic() - self.last_flush_time >= self.max_age or (buffered_rows >= self.max_rows and not self.failed):
+            self.flush()
+
+    def drop_oldest_rows(self, overflow: int):
+        """
+        Verwirft die ältesten gepufferten Einträge für node_metric_entries, sodass overflow Einträge weniger gepuffert sind.
+
+        Es werden zusätzlich max_rows Einträge verworfen, damit nicht jeder weitere Eintrag den Puffer erneut kürzt.
+        """
+
+        dropped_rows = min(len(self.metric_rows), overflow + self.max_rows)
+        del self.metric_rows[:dropped_rows]
+
+        logger.error(f"Dropped the {dropped_rows} oldest metric entries, the buffer exceeded {self.max_buffered_rows} rows")
+
+    def get_connection(self) -> psycopg.Connection:
+        """
+        Gibt die Datenbankverbindung zurück und baut sie neu auf, wenn sie geschlossen oder unterbrochen ist.
+
+        Alle Komponenten des Operators verwenden diese Verbindung. Schlägt der Aufbau fehl, wird psycopg.Error ausgelöst.
+        """
+
+        if self.connect is not None and (self.db.closed or self.db.broken):
+            logger.warning("Database connection lost, reconnecting")
+            self.db = self.connect()
+
+        return self.db
+
+    def flush(self):
+        """
+        Schreibt alle gepufferten Einträge in einer einzigen Transaktion in die Datenbank.
+
+        Schlägt das Schreiben fehl, bleiben die Einträge im Puffer und werden frühestens nach max_age Sekunden
+        oder am Ende des nächsten Zyklus erneut geschrieben.
+        """
+
+        self.last_flush_time = time.monotonic()
+
+        if not self.metric_rows and not self.node_info_rows:
+            return
+
+        try:
+            with metrics.PHASE_DURATION.labels("db_flush").time(), metrics.count_db("flush"):
+                db = self.get_connection()
+
+                # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
+                cursor = db.cursor()
+
+                if self.node_info_rows:
+                    with cursor.copy("COPY node_infos (node_name, lat, lng) FROM STDIN") as copy:
+                        for row in self.node_info_rows:
+                            copy.write_row(row)
+
+                if self.metric_rows:
+                    with cursor.copy("COPY node_metric_entries (node_name, value_type, timestamp, value) FROM STDIN") as copy:
+                        for row in self.metric_rows:
+                            copy.write_row(row)
+
+                    self.write_rollups(cursor, get_rollup_rows(self.metric_rows))
+
+                # Commit der Änderungen an der Datenbank
+                db.commit()
+        except psycopg.Error as e:
+            logger.error(f"Failed to flush {len(self.metric_rows) + len(self.node_info_rows)} metric rows: {e}")
+
+            # Verwerfen der Transaktion, die gepufferten Einträge bleiben erhalten
+            # Bei einer unterbrochenen Verbindung schlägt auch das Verwerfen fehl, die Drosselung muss trotzdem greifen
+            try:
+                rollback(self.db)
+            finally:
+                self.failed = True
+
+            return
+
+        self.failed = False
+
+        logger.info(f"Flushed {len(self.metric_rows)} metric entries and {len(self.node_info_rows)} node infos")
+
+        self.metric_rows.clear()
+        self.node_info_rows.clear()
+
+    def write_rollups(self, cursor: psycopg.Cursor, rollup_rows: list[tuple]):
+        """
+        Fügt die Zeilen in node_metric_rollups_5min ein oder aktualisiert bereits vorhandene Intervalle.
+
+        Ein bereits gespeicherter MOER-Wert bleibt erhalten, wenn das Intervall in diesem Aufruf nur einen POWER-Wert enthält.
+        Fehlt der POWER-Wert, gilt der des Intervalls oder des letzten früheren Intervalls in der Tabelle, sonst 1.
+        """
+
+        # Alle Zeilen werden spaltenweise als Arrays in einer einzigen Anweisung übertragen
+        columns = [list(column) for column in zip(*rollup_rows)]
+
+        cursor.execute("""
+            INSERT INTO node_metric_rollups_5min AS rollups (bucket, node_name, moer, power, moer_power)
+            SELECT entries.bucket, entries.node_name, entries.moer, filled.power, entries.moer * filled.power
+            FROM unnest(%s::timestamp[], %s::varchar[], %s::float[], %s::float[]) AS entries (bucket, node_name, moer, power)
+            CROSS JOIN LATERAL (
+                SELECT coalesce(entries.power, (
+                    SELECT previous.power FROM node_metric_rollups_5min AS previous
+                    WHERE previous.node_name = entries.node_name AND previous.bucket <= entries.bucket
+                    ORDER BY previous.bucket DESC
+                    LIMIT 1
+                ), 1) AS power
+            ) AS filled
+            ON CONFLICT (bucket, node_name) DO UPDATE SET
+                moer = coalesce(EXCLUDED.moer, rollups.moer),
+                power = EXCLUDED.power,
+                moer_power = coalesce(EXCLUDED.moer, rollups.moer) * EXCLUDED.power
+        """, columns)
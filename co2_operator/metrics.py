@@ -0,0 +1,91 @@
+import contextlib
+import functools
+import prometheus_client
+
+# Dauer eines vollständigen Optimierungszyklus
+CYCLE_DURATION = prometheus_client.Histogram(
+    "co2_operator_cycle_duration_seconds",
+    "Duration of a complete optimization cycle",
+    buckets= (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+
+# Dauer der einzelnen Phasen eines Zyklus
+# node_list, moer_fetch, selection, patch, evict, drain_wait, db_flush, db_maintenance
+PHASE_DURATION = prometheus_client.Histogram(
+    "co2_operator_phase_duration_seconds",
+    "Duration of a single phase of an optimization cycle",
+    ["phase"],
+    buckets= (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+)
+
+API_CALLS = prometheus_client.Counter("co2_operator_api_calls_total", "Kubernetes API calls", ["method"])
+API_ERRORS = prometheus_client.Counter("co2_operator_api_errors_total", "Failed Kubernetes API calls", ["method"])
+
+DB_OPERATIONS = prometheus_client.Counter("co2_operator_db_operations_total", "Database transactions", ["operation"])
+DB_ERRORS = prometheus_client.Counter("co2_operator_db_errors_total", "Failed database transactions", ["operation"])
+
+EVICTIONS = prometheus_client.Counter("co2_operator_evictions_total", "Pod evictions by result (evicted, retried, failed, skipped)", ["result"])
+
+NODE_SWITCHES = prometheus_client.Counter("co2_operator_node_switches_total", "Planned node state changes by direction (allowed, disallowed)", ["direction"])
+
+ALLOWED_NODES = prometheus_client.Gauge("co2_operator_allowed_nodes", "Nodes allowed for pod scheduling in the last cycle")
+DISALLOWED_NODES = prometheus_client.Gauge("co2_operator_disallowed_nodes", "Nodes disallowed for pod scheduling in the last cycle")
+FLEET_MOER = prometheus_client.Gauge("co2_operator_fleet_moer", "Sum of the MOER values of all allowed nodes in the last cycle")
+
+SHARD_LEADER = prometheus_client.Gauge("co2_operator_shard_leader", "1 if this replica computed the plan of the last cycle")
+SHARD_OWNED_NODES = prometheus_client.Gauge("co2_operator_shard_owned_nodes", "Nodes handled by this replica in the last cycle")
+
+def start_server(port: int):
+    """
+    Startet den HTTP-Server, der die Metriken unter /metrics bereitstellt.
+    """
+
+    prometheus_client.start_http_server(port)
+
+@contextlib.contextmanager
+def count_db(operation: str):
+    """
+    Zählt eine Datenbank-Transaktion und, falls sie eine Ausnahme auslöst, einen Fehler.
+    """
+
+    DB_OPERATIONS.labels(operation).inc()
+
+    try:
+        yield
+    except Exception:
+        DB_ERRORS.labels(operation).inc()
+        raise
+
+class InstrumentedApi:
+    """
+    Umhüllt ein Kubernetes API-Objekt und zählt alle Aufrufe und Fehler je Methode.
+
+    Die umhüllte Methode wird beim ersten Zugriff erzeugt und am Objekt zwischengespeichert,
+    sodass jeder weitere Aufruf nur das Erhöhen eines Zählers kostet.
+    """
+
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._api, name)
+
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        calls = API_CALLS.labels(name)
+        errors = API_ERRORS.labels(name)
+
+        # functools.wraps erhält den Docstring, anhand dessen kubernetes.watch den Rückgabetyp ermittelt
+        @functools.wraps(attribute)
+        def call(*args, **kwargs):
+            calls.inc()
+
+            try:
+                return attribute(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+
+        setattr(self, name, call)
+        return call
@@ -0,0 +1,284 @@
+import watttime
+import random
+import time
+import datetime
+import threading
+import logging
+import concurrent.futures
+
+logger = logging.getLogger(__name__)
+
+class MoerProvider:
+    """
+    Schnittstelle für die Ermittlung der CO2-Emissionsraten (MOER-Werte) von Nodes.
+    """
+
+    def get_moer_values(self, node_locations: dict[str, dict]) -> dict[str, float]:
+        """
+        Gibt den aktuellen MOER-Wert für jeden Node zurück.
+
+        node_locations ordnet jedem Node-Namen seine Koordinaten ({"lat": ..., "lng": ...}) zu.
+        Nodes, für die kein Wert ermittelt werden kann, fehlen im Ergebnis.
+        """
+
+        raise NotImplementedError
+
+    def get_forecast_values(self, node_locations: dict[str, dict], horizon: int) -> dict[str, float]:
+        """
+        Gibt den mittleren vorhergesagten MOER-Wert jedes Nodes über die nächsten horizon Sekunden zurück.
+
+        Nodes ohne Vorhersage fehlen im Ergebnis, standardmäßig liefert ein Anbieter keine Vorhersagen.
+        """
+
+        return {}
+
+class SimulatedMoerProvider(MoerProvider):
+    """
+    Simuliert die MOER-Werte der Nodes als zufällige Irrfahrt.
+
+    Notwendig, da die Regionen der WattTime API für eine Auswertung nicht ausreichen.
+    """
+
+    def __init__(self, initial_value= 50, steps= (-4, -2, 2, 4), min_value= 25, max_value= 75):
+        self.initial_value = initial_value
+        self.steps = steps
+        self.min_value = min_value
+        self.max_value = max_value
+
+        # Letzter simulierter MOER-Wert je Node
+        self.values: dict[str, float] = {}
+
+    def get_moer_values(self, node_locations: dict[str, dict]) -> dict[str, float]:
+        for node_name in node_locations:
+            # Standardmässig wird der MOER-Wert auf initial_value simuliert, sofern er noch nicht existiert
+            previous_value = self.values.get(node_name, self.initial_value)
+
+            # Bei jedem Abruf wird der MOER-Wert zufällig um einen der Schritte erhöht oder verringert
+            # Dabei darf er min_value-max_value nicht überschreiten
+            moer_value = previous_value + random.choice(self.steps)
+            self.values[node_name] = max(self.min_value, min(self.max_value, moer_value))
+
+        return {node_name: self.values[node_name] for node_name in node_locations}
+
+class WattTimeMoerProvider(MoerProvider):
+    """
+    Ermittelt die MOER-Werte der Nodes über die WattTime API.
+
+    Die Zuordnung von Koordinaten zu Regionen wird dauerhaft gespeichert, Vorhersagen werden je Region
+    für forecast_ttl Sekunden zwischengespeichert. Jede Region wird pro Abruf höchstens einmal und
+    parallel zu den anderen Regionen abgefragt, sodass die Anzahl der API-Aufrufe mit der Anzahl
+    der Regionen und nicht mit der Anzahl der Nodes wächst.
+
+    Als aktueller MOER-Wert gilt der Punkt der Vorhersage, der den aktuellen Zeitpunkt abdeckt. Schlägt die
+    Aktualisierung einer Region fehl, wird ihre Vorhersage höchstens max_forecast_age Sekunden (standardmäßig
+    das Dreifache von forecast_ttl) weiterverwendet, danach fehlen die Nodes der Region im Ergebnis.
+    """
+
+    def __init__(self, wt_api: watttime.WattTimeForecast, forecast_ttl= 300, horizon_hours= 0, max_workers= 8, signal_type= "co2_moer",
+                 max_forecast_age= None):
+        self.wt_api = wt_api
+        self.forecast_ttl = forecast_ttl
+        self.max_forecast_age = max_forecast_age if max_forecast_age is not None else 3 * forecast_ttl
+        self.horizon_hours = horizon_hours
+        self.max_workers = max(1, max_workers)
+        self.signal_type = signal_type
+
+        # Dauerhafte Zuordnung von Koordinaten (lat, lng) zu einer Region
+        self.regions: dict[tuple, str] = {}
+
+        # Zwischengespeicherte Vorhersagen je Region (Region -> (Abrufzeitpunkt, Vorhersage))
+        self.forecasts: dict[str, tuple] = {}
+
+        self._lock = threading.Lock()
+
+    def get_moer_values(self, node_locations: dict[str, dict]) -> dict[str, float]:
+        # Ermitteln der Regionen aller noch unbekannten Koordinaten
+        locations = {(lat_lng["lat"], lat_lng["lng"]) for lat_lng in node_locations.values()}
+        self._resolve_regions([location for location in locations if location not in self.regions])
+
+        # Abrufen der Vorhersagen aller Regionen, deren Vorhersage abgelaufen ist
+        node_regions = {
+            node_name: self.regions.get((lat_lng["lat"], lat_lng["lng"]))
+            for node_name, lat_lng in node_locations.items()
+        }
+        self._refresh_forecasts({region for region in node_regions.values() if region is not None})
+
+        moer_values = {}
+
+        # Aktuelle Punkte der Vorhersage je Region, die Punkte werden je Region nur einmal ausgewertet
+        region_points = {}
+
+        for node_name, region in node_regions.items():
+            if region is not None and region not in region_points:
+                region_points[region] = self._get_current_points(region)
+
+            points = region_points.get(region)
+
+            if not points:
+                logger.error(f"No MOER value available for node {node_name}")
+                continue
+
+            moer_values[node_name] = points[0][1]
+
+        return moer_values
+
+    def get_forecast_values(self, node_locations: dict[str, dict], horizon: int) -> dict[str, float]:
+        # Die Vorhersagen wurden bereits mit get_moer_values abgerufen, der Mittelwert wird je Region einmal berechnet
+        region_values = {}
+        forecast_values = {}
+
+        for node_name, lat_lng in node_locations.items():
+            region = self.regions.get((lat_lng["lat"], lat_lng["lng"]))
+
+            if region is None:
+                continue
+
+            if region not in region_values:
+                region_values[region] = self._get_forecast_mean(region, horizon)
+
+            if region_values[region] is not None:
+                forecast_values[node_name] = region_values[region]
+
+        return forecast_values
+
+    def _get_forecast_mean(self, region: str, horizon: int) -> float:
+        """
+        Berechnet den Mittelwert der Vorhersage einer Region über die nächsten horizon Sekunden.
+
+        Gibt None zurück, wenn die Vorhersage nur den aktuellen Wert enthält.
+        """
+
+        points = self._get_current_points(region)
+
+        if not points or len(points) < 2:
+            return None
+
+        start = points[0][0]
+        values = [value for point_time, value in points if (point_time - start).total_seconds() < horizon]
+
+        return sum(values) / len(values)
+
+    def _get_current_points(self, region: str) -> list[tuple]:
+        """
+        Gibt die Punkte (Zeitpunkt, MOER-Wert) der Vorhersage einer Region ab dem Punkt zurück, der den aktuellen Zeitpunkt abdeckt.
+
+        Gibt None zurück, wenn keine ausreichend aktuelle Vorhersage vorhanden ist.
+        """
+
+        forecast = self.get_forecast(region)
+        data = forecast.get("data") if forecast else None
+
+        if not data:
+            return None
+
+        points = [(datetime.datetime.fromisoformat(point["point_time"]), point["value"]) for point in data]
+
+        # Der letzte Punkt, der nicht in der Zukunft liegt, gilt für den aktuellen Zeitpunkt
+        now = datetime.datetime.now(datetime.timezone.utc)
+        current = max((index for index, (point_time, _) in enumerate(points) if point_time <= now), default= 0)
+
+        return points[current:]
+
+    def get_forecast(self, region: str) -> dict:
+        """
+        Gibt die zuletzt abgerufene Vorhersage einer Region zurück oder None, wenn keine vorhanden ist.
+
+        Vorhersagen, die älter als max_forecast_age Sekunden sind, gelten als nicht vorhanden.
+        """
+
+        with self._lock:
+            cached = self.forecasts.get(region)
+
+        if cached is None:
+            return None
+
+        if time.monotonic() - cached[0] > self.max_forecast_age:
+            return None
+
+        return cached[1]
+
+    def _resolve_regions(self, locations: list[tuple]):
+        """
+        Ermittelt die Regionen der übergebenen Koordinaten parallel.
+        """
+
+        if not locations:
+            return
+
+        def resolve(location: tuple):
+            region_info = self.wt_api.region_from_loc(
+                signal_type= self.signal_type,
+                latitude= location[0],
+                longitude= location[1]
+            )
+
+            return region_info["region"]
+
+        for location, region in self._run_concurrently(resolve, locations).items():
+            self.regions[location] = region
+
+    def _refresh_forecasts(self, regions: set[str]):
+        """
+        Ruft die Vorhersagen aller übergebenen Regionen parallel ab, deren zwischengespeicherte Vorhersage abgelaufen ist.
+        """
+
+        now = time.monotonic()
+
+        with self._lock:
+            expired_regions = [
+                region for region in regions
+                if region not in self.forecasts or now - self.forecasts[region][0] >= self.forecast_ttl
+            ]
+
+        if not expired_regions:
+            return
+
+        def fetch(region: str):
+            return self.wt_api.get_forecast_json(
+                region= region,
+                signal_type= self.signal_type,
+                horizon_hours= self.horizon_hours
+            )
+
+        forecasts = self._run_concurrently(fetch, expired_regions)
+
+        with self._lock:
+            for region, forecast in forecasts.items():
+                self.forecasts[region] = (now, forecast)
+
+    def _run_concurrently(self, function, keys: list) -> dict:
+        """
+        Führt function parallel für alle Schlüssel aus und gibt die erfolgreichen Ergebnisse je Schlüssel zurück.
+
+        Fehlgeschlagene Abrufe werden protokolliert, bereits zwischengespeicherte Werte bleiben dann erhalten.
+        """
+
+        results = {}
+        keys = list(keys)
+
+        # Der WattTime-Client meldet sich beim ersten Abruf ohne gültiges Token selbst an. Die Abrufe erfolgen daher
+        # nacheinander, bis einer erfolgreich ist, sonst würde sich jeder parallele Thread einzeln anmelden
+        while keys:
+            key = keys.pop(0)
+
+            try:
+                results[key] = function(key)
+                break
+            except Exception as e:
+                logger.error(f"WattTime request for {key} failed: {e}")
+
+        if not keys:
+            return results
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers= min(self.max_workers, len(keys)), thread_name_prefix= "watttime") as executor:
+            futures = {executor.submit(function, key): key for key in keys}
+
+            for future in concurrent.futures.as_completed(futures):
+                key = futures[future]
+
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    logger.error(f"WattTime request for {key} failed: {e}")
+
+        return results
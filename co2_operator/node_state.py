@@ -0,0 +1,117 @@
+import psycopg
+import logging
+from co2_operator.metric_sink import MetricSink
+
+logger = logging.getLogger(__name__)
+
+class NodeStateStore:
+    """
+    Hält die Koordinaten und den letzten Betriebszustand (POWER) aller Nodes im Speicher.
+
+    Der Zustand wird beim Start einmalig aus der Datenbank geladen. Änderungen werden sofort im
+    Speicher übernommen und über den MetricSink in die Datenbank geschrieben (Write-Through),
+    sodass während eines Zyklus keine Lesezugriffe auf die Datenbank nötig sind.
+
+    Der letzte POWER-Wert wird aus node_metric_rollups_5min gelesen, deren Zeilen den zuletzt bekannten POWER-Wert
+    fortschreiben und im Gegensatz zu den Partitionen von node_metric_entries nicht nach METRIC_RETENTION_DAYS gelöscht werden.
+    """
+
+    # Letzter POWER-Wert je Node, über den Index (node_name, bucket DESC) der Rollups
+    LATEST_POWER_SQL = """
+        SELECT nodes.node_name, latest.power
+        FROM {nodes} AS nodes (node_name)
+        CROSS JOIN LATERAL (
+            SELECT power FROM node_metric_rollups_5min AS rollups
+            WHERE rollups.node_name = nodes.node_name
+            ORDER BY bucket DESC
+            LIMIT 1
+        ) AS latest
+    """
+
+    def __init__(self, sink: MetricSink, locations: dict[str, dict] = None, power_states: dict[str, bool] = None):
+        self.sink = sink
+
+        # Koordinaten je Node (Node-Name -> {"lat": ..., "lng": ...})
+        self.locations = locations if locations is not None else {}
+
+        # Letzter bekannter Betriebszustand je Node (Node-Name -> läuft)
+        self.power_states = power_states if power_states is not None else {}
+
+    @classmethod
+    def load(cls, db: psycopg.Connection, sink: MetricSink) -> "NodeStateStore":
+        """
+        Lädt die Koordinaten und den letzten POWER-Wert aller Nodes aus der Datenbank.
+        """
+
+        # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
+        cursor = db.cursor()
+
+        # Abrufen der geografischen Koordinaten aller Nodes
+        locations = {
+            node_name: {"lat": lat, "lng": lng}
+            for node_name, lat, lng in cursor.execute("SELECT node_name, lat, lng FROM node_infos").fetchall()
+        }
+
+        # Abrufen des jeweils letzten POWER-Werts aller Nodes mit bekannten Koordinaten
+        power_states = {
+            node_name: value > 0
+            for node_name, value in cursor.execute(
+                cls.LATEST_POWER_SQL.format(nodes= "(SELECT DISTINCT node_name FROM node_infos)")
+            ).fetchall()
+        }
+
+        # Beenden der lesenden Transaktion
+        db.commit()
+
+        logger.info(f"Loaded state of {len(power_states)} nodes and locations of {len(locations)} nodes")
+
+        return cls(sink, locations, power_states)
+
+    def reload_power_states(self, db: psycopg.Connection, node_names: set[str]):
+        """
+        Lädt den letzten POWER-Wert der übergebenen Nodes erneut aus der Datenbank.
+
+        Wird benötigt, wenn ein Replikat Nodes übernimmt, deren Betriebszustand bisher ein anderes Replikat geschrieben hat.
+        """
+
+        # Erstellen eines Datenbank-Cursors für die Ausführung von SQL-Abfragen
+        cursor = db.cursor()
+
+        for node_name, value in cursor.execute(
+            self.LATEST_POWER_SQL.format(nodes= "unnest(%s::varchar[])"),
+            (list(node_names),)
+        ).fetchall():
+            self.power_states[node_name] = value > 0
+
+        # Beenden der lesenden Transaktion
+        db.commit()
+
+    def get_location(self, node_name: str) -> dict:
+        """
+        Gibt die gespeicherten Koordinaten eines Nodes zurück oder None, wenn sie noch nicht bekannt sind.
+        """
+
+        return self.locations.get(node_name)
+
+    def set_location(self, node_name: str, lat: float, lng: float):
+        """
+        Speichert die Koordinaten eines Nodes im Speicher und in der Datenbank.
+        """
+
+        self.locations[node_name] = {"lat": lat, "lng": lng}
+        self.sink.add_node_info(node_name, lat, lng)
+
+    def is_running(self, node_name: str) -> bool:
+        """
+        Gibt den letzten bekannten Betriebszustand eines Nodes zurück oder None, wenn er noch nicht bekannt ist.
+        """
+
+        return self.power_states.get(node_name)
+
+    def set_running(self, node_name: str, running: bool, timestamp: str):
+        """
+        Speichert den Betriebszustand eines Nodes im Speicher und als "POWER"-Metrik in der Datenbank.
+        """
+
+        self.power_states[node_name] = running
+        self.sink.add_metric(node_name, "POWER", 1 if running else 0, timestamp)
@@ -0,0 +1,253 @@
+import kubernetes
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Standardanforderungen für Container ohne eigene Anforderungen, wie sie auch der Kubernetes Scheduler annimmt
+DEFAULT_CPU_REQUEST = 0.1
+DEFAULT_MEMORY_REQUEST = 200 * 1024 * 1024
+
+def parse_quantity(value, default= 0.0) -> float:
+    """
+    Wandelt eine Kubernetes-Mengenangabe (z.B. "500m" oder "2Gi") in eine Zahl um.
+    """
+
+    if value is None:
+        return default
+
+    return float(kubernetes.utils.parse_quantity(value))
+
+def is_daemonset_pod(pod: kubernetes.client.V1Pod) -> bool:
+    """
+    Prüft, ob ein Pod von einem DaemonSet verwaltet wird und damit auf jedem Node läuft.
+    """
+
+    return any(owner.kind == "DaemonSet" for owner in pod.metadata.owner_references or [])
+
+def is_pod_finished(pod: kubernetes.client.V1Pod) -> bool:
+    """
+    Prüft, ob ein Pod beendet ist und keine Ressourcen mehr belegt.
+    """
+
+    return pod.status is not None and pod.status.phase in ("Succeeded", "Failed")
+
+def get_pod_requests(pod: kubernetes.client.V1Pod) -> tuple[float, float, float]:
+    """
+    Gibt die Ressourcenanforderungen eines Pods als (CPU-Kerne, Arbeitsspeicher in Bytes, Anzahl Pods) zurück.
+
+    Wie beim Kubernetes Scheduler gilt das Maximum aus der Summe der Container und dem größten Init-Container.
+    """
+
+    def container_requests(container: kubernetes.client.V1Container) -> tuple[float, float]:
+        requests = (container.resources.requests if container.resources else None) or {}
+
+        return (
+            parse_quantity(requests.get("cpu"), DEFAULT_CPU_REQUEST),
+            parse_quantity(requests.get("memory"), DEFAULT_MEMORY_REQUEST)
+        )
+
+    containers = [container_requests(container) for container in pod.spec.containers or []]
+    init_containers = [container_requests(container) for container in pod.spec.init_containers or []]
+
+    cpu = max([sum(cpu for cpu, _ in containers)] + [cpu for cpu, _ in init_containers])
+    memory = max([sum(memory for _, memory in containers)] + [memory for _, memory in init_containers])
+
+    return (cpu, memory, 1.0)
+
+def get_node_allocatable(node: kubernetes.client.V1Node) -> tuple[float, float, float]:
+    """
+    Gibt die zuweisbaren Ressourcen eines Nodes als (CPU-Kerne, Arbeitsspeicher in Bytes, Anzahl Pods) zurück.
+    """
+
+    allocatable = (node.status.allocatable if node.status else None) or {}
+
+    return (
+        parse_quantity(allocatable.get("cpu")),
+        parse_quantity(allocatable.get("memory")),
+        parse_quantity(allocatable.get("pods"))
+    )
+
+def get_cluster_demand(nodes: list[kubernetes.client.V1Node], pods: list[kubernetes.client.V1Pod], ignored_node_names: list[str]):
+    """
+    Ermittelt die Kapazität der Nodes und die Anforderungen der Pods, die auf diesen Nodes untergebracht werden müssen.
+
+    DaemonSet-Pods laufen auf jedem Node und verringern daher die Kapazität ihres Nodes, statt umverteilt zu werden.
+    Pods auf ignorierten Nodes sowie beendete Pods werden nicht berücksichtigt.
+    Gibt (Kapazität je Node, Liste der Pod-Anforderungen) zurück.
+    """
+
+    node_capacities = {node.metadata.name: list(get_node_allocatable(node)) for node in nodes}
+    pod_requests = []
+
+    for pod in pods:
+        if is_pod_finished(pod) or pod.spec.node_name in ignored_node_names:
+            continue
+
+        requests = get_pod_requests(pod)
+
+        if is_daemonset_pod(pod):
+            capacity = node_capacities.get(pod.spec.node_name)
+
+            if capacity is not None:
+                for i, request in enumerate(requests):
+                    capacity[i] -= request
+
+            continue
+
+        pod_requests.append(requests)
+
+    return {node_name: tuple(capacity) for node_name, capacity in node_capacities.items()}, pod_requests
+
+def select_nodes(node_moer_values: dict[str, float], node_capacities: dict[str, tuple], pod_requests: list[tuple], headroom= 0.2, min_nodes= 1,
+                 required_nodes= ()) -> list[str]:
+    """
+    Wählt die Nodes mit den niedrigsten MOER-Werten aus, die zusammen alle Pods inklusive Reserve (headroom) aufnehmen können.
+
+    Zunächst werden so viele Nodes aus einem nach MOER-Wert geordneten Heap entnommen, bis ihre Gesamtkapazität
+    die Gesamtanforderung deckt. Anschließend werden die Pods absteigend nach Größe per Greedy-Bin-Packing
+    jeweils auf den Node mit der meisten freien Kapazität verteilt. Passt ein Pod dort nicht, wird er auf einem
+    der übrigen ausgewählten Nodes untergebracht, sonst wird der günstigste noch nicht ausgewählte Node hinzugenommen,
+    auf den er passt. Sind alle Nodes ausgewählt, gilt ein solcher Pod ohne weitere Suche als nicht untergebracht.
+    Im Regelfall beträgt die Laufzeit O((Nodes + Pods) * log(Nodes + Pods)).
+
+    Die Nodes in required_nodes werden unabhängig von ihrem MOER-Wert immer ausgewählt und zuerst belegt.
+    """
+
+    def has_capacity(node_name: str) -> bool:
+        return node_name in node_capacities and all(capacity > 0 for capacity in node_capacities[node_name])
+
+    required_nodes = [node_name for node_name in required_nodes if node_name in node_moer_values]
+    required_node_names = set(required_nodes)
+
+    # Nodes ohne MOER-Wert oder ohne zuweisbare Ressourcen können keine Pods aufnehmen
+    candidates = [
+        (moer_value, node_name) for node_name, moer_value in node_moer_values.items()
+        if node_name not in required_node_names and has_capacity(node_name)
+    ]
+    heapq.heapify(candidates)
+
+    # Pods werden nur auf Nodes mit zuweisbaren Ressourcen verteilt
+    usable_node_names = [node_name for _, node_name in candidates] + [node_name for node_name in required_nodes if has_capacity(node_name)]
+
+    if not usable_node_names:
+        # Ohne bekannte Kapazität bleiben zumindest die min_nodes günstigsten Nodes zulässig
+        if node_moer_values:
+            logger.warning("No node reports allocatable resources, allowing the cheapest nodes only")
+
+        cheapest_nodes = [node_name for node_name, _ in sorted(node_moer_values.items(), key= lambda item: item[1]) if node_name not in required_node_names]
+
+        return required_nodes + cheapest_nodes[:max(min_nodes - len(required_nodes), 0)]
+
+    # Größte Kapazität je Ressource, um freie Kapazitäten verschiedener Ressourcen vergleichbar zu machen
+    reference = [max(max(node_capacities[node_name][i] for node_name in usable_node_names), 1e-9) for i in range(3)]
+
+    # Anforderungen inklusive Reserve, absteigend nach Größe sortiert
+    scale = 1 + headroom
+    requests = sorted(((cpu * scale, memory * scale, pods) for cpu, memory, pods in pod_requests), reverse= True)
+
+    # Pods, die auf keinen einzelnen Node passen, dürfen nicht zur Auswahl aller Nodes führen
+    unplaced_pods = sum(1 for request in requests if any(request[i] > reference[i] for i in range(3)))
+    requests = [request for request in requests if all(request[i] <= reference[i] for i in range(3))]
+
+    selected = []
+
+    # Freie Kapazität je ausgewähltem Node und Max-Heap darüber, veraltete Einträge werden erst an der Spitze verworfen
+    free_capacities = {}
+    free_heap = []
+
+    # Anforderungen, die auf keinen Node passen, damit gleiche Pods nicht erneut alle Nodes durchsuchen
+    unplaceable_requests = set()
+
+    # Anzahl der zuerst ausgewählten Nodes je Anforderung, auf die sie bei einer früheren Suche nicht gepasst hat
+    # Freie Kapazitäten sinken nur, daher beginnt die nächste Suche nach diesen Nodes
+    scanned_nodes = {}
+
+    def fits(request: tuple, free: tuple) -> bool:
+        return all(request[i] <= free[i] for i in range(3))
+
+    def set_free(node_name: str, free: tuple):
+        # Max-Heap nach der knappsten, relativen freien Ressource des Nodes
+        free_capacities[node_name] = free
+        heapq.heappush(free_heap, (-min(free[i] / reference[i] for i in range(3)), node_name, free))
+
+    def add_node(node_name: str):
+        selected.append(node_name)
+        set_free(node_name, node_capacities[node_name])
+
+    def allocate(node_name: str, request: tuple):
+        free = free_capacities[node_name]
+        set_free(node_name, tuple(free[i] - request[i] for i in range(3)))
+
+    def place(request: tuple) -> bool:
+        while free_heap and free_heap[0][2] is not free_capacities[free_heap[0][1]]:
+            heapq.heappop(free_heap)
+
+        # Der Node mit der meisten freien Kapazität wird zuerst geprüft
+        if free_heap and fits(request, free_heap[0][2]):
+            allocate(free_heap[0][1], request)
+            return True
+
+        # Ohne weitere Kandidaten ändert die Verteilung die Auswahl nicht mehr
+        if request in unplaceable_requests or not candidates:
+            return False
+
+        # Bei unterschiedlich großen Nodes kann ein anderer ausgewählter Node die knappe Ressource noch frei haben
+        for index in range(scanned_nodes.get(request, 0), len(selected)):
+            if fits(request, free_capacities[selected[index]]):
+                scanned_nodes[request] = index
+                allocate(selected[index], request)
+                return True
+
+        scanned_nodes[request] = len(selected)
+
+        # Hinzunehmen des günstigsten Nodes, auf den der Pod passt, übersprungene Nodes bleiben Kandidaten
+        skipped = []
+
+        while candidates:
+            candidate = heapq.heappop(candidates)
+
+            if fits(request, node_capacities[candidate[1]]):
+                add_node(candidate[1])
+
+                for entry in skipped:
+                    heapq.heappush(candidates, entry)
+
+                allocate(candidate[1], request)
+                return True
+
+            skipped.append(candidate)
+
+        candidates.extend(skipped)
+        heapq.heapify(candidates)
+
+        unplaceable_requests.add(request)
+        return False
+
+    # Hinzunehmen der vorgegebenen Nodes, Nodes ohne zuweisbare Ressourcen erhalten keine Pods
+    for node_name in required_nodes:
+        if has_capacity(node_name):
+            add_node(node_name)
+        else:
+            selected.append(node_name)
+
+    # Hinzunehmen der günstigsten Nodes, bis die Gesamtkapazität die Gesamtanforderung deckt
+    total_demand = [sum(request[i] for request in requests) for i in range(3)]
+    total_capacity = [sum(free_capacities[node_name][i] for node_name in free_capacities) for i in range(3)]
+
+    while candidates and (len(selected) < min_nodes or any(total_capacity[i] < total_demand[i] for i in range(3))):
+        _, node_name = heapq.heappop(candidates)
+        add_node(node_name)
+
+        free = node_capacities[node_name]
+        total_capacity = [total_capacity[i] + free[i] for i in range(3)]
+
+    # Verteilen der Pods, bei Bedarf mit weiteren Nodes
+    for request in requests:
+        if not place(request):
+            unplaced_pods += 1
+
+    if unplaced_pods:
+        logger.warning(f"{unplaced_pods} pods do not fit on the available nodes")
+
+    return selected
@@ -0,0 +1,190 @@
+import kubernetes
+import collections
+import datetime
+import time
+import logging
+from co2_operator.placement import select_nodes
+from co2_operator import metrics
+
+logger = logging.getLogger(__name__)
+
+# Verschiebung der Werte gesperrter Nodes innerhalb ihrer Mindestverweildauer, sodass select_nodes
+# sie erst nach allen anderen Nodes auswählt
+PINNED_OFFSET = 1e6
+
+# Annotation mit dem Zeitpunkt des letzten Wechsels eines Nodes, damit alle Replikate und ein neu gestarteter
+# Operator die Mindestverweildauer kennen
+SWITCHED_AT_ANNOTATION = "co2-operator/switched-at"
+
+def get_switched_at(node: kubernetes.client.V1Node) -> float:
+    """
+    Gibt den Zeitpunkt des letzten Wechsels eines Nodes als Unix-Zeit zurück oder None, wenn er unbekannt ist.
+    """
+
+    value = (node.metadata.annotations or {}).get(SWITCHED_AT_ANNOTATION)
+
+    if value is None:
+        return None
+
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+def get_switched_at_annotations(timestamp: float) -> dict[str, str]:
+    """
+    Gibt die Annotationen zurück, mit denen ein Wechsel zum Zeitpunkt timestamp (Unix-Zeit) am Node vermerkt wird.
+    """
+
+    return {SWITCHED_AT_ANNOTATION: datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()}
+
+class HysteresisPlanner:
+    """
+    Wählt die zulässigen Nodes mit Hysterese aus, damit Nodes nahe der Auswahlgrenze nicht in jedem Zyklus wechseln.
+
+    Statt des aktuellen MOER-Werts wird ein über horizon Sekunden projizierter Wert verglichen: der Mittelwert der
+    Vorhersage, sofern der MoerProvider eine liefert, sonst der gleitende Mittelwert der Werte der letzten horizon Sekunden.
+    Ein zulässiger Node wird nur durch einen gesperrten ersetzt, wenn dessen projizierter Wert um mindestens
+    switch_margin niedriger ist, also um switch_threshold und so weit, dass die Einsparung über den Horizont die
+    Kosten eines Wechsels (drain_cost in MOER-Stunden) übersteigt. Nach einem Wechsel behält ein Node seinen Zustand
+    für min_dwell Sekunden: ein zulässiger Node wird davor nie gesperrt, ein gesperrter Node wird davor nur zugelassen,
+    wenn sonst die Kapazität nicht ausreicht.
+
+    Maßgeblich ist der beobachtete Zustand der Nodes und der Zeitpunkt ihres letzten Wechsels aus der Annotation
+    SWITCHED_AT_ANNOTATION. Nur im Dry-Run-Modus, in dem sich die Nodes nicht ändern, plant der Planer auf seinem
+    eigenen zuletzt geplanten Zustand weiter.
+    """
+
+    def __init__(self, horizon= 3600, min_dwell= 1800, switch_threshold= 5.0, drain_cost= 5.0, clock= time.time):
+        self.horizon = horizon
+        self.min_dwell = min_dwell
+        self.switch_threshold = switch_threshold
+        self.drain_cost = drain_cost
+        self.clock = clock
+
+        # Bisherige MOER-Werte je Node als (Zeitpunkt, MOER-Wert)
+        self._history: dict[str, collections.deque] = {}
+
+        # Zuletzt geplanter Zustand und Zeitpunkt des letzten Wechsels je Node
+        self._allowed: dict[str, bool] = {}
+        self._changed_at: dict[str, float] = {}
+
+        # Amtszeit als Leader, in der der Zustand gesammelt wurde
+        self._term = None
+
+    def start_term(self, term):
+        """
+        Verwirft den gesamten Zustand, wenn in einer neuen Amtszeit als Leader geplant wird.
+
+        Während ein anderes Replikat Leader war, wurden weder Verlauf noch Wechsel aufgezeichnet.
+        """
+
+        if term == self._term:
+            return
+
+        self._history.clear()
+        self._allowed.clear()
+        self._changed_at.clear()
+        self._term = term
+
+    @property
+    def switch_margin(self) -> float:
+        """
+        Mindestunterschied der projizierten MOER-Werte, ab dem ein zulässiger Node ersetzt wird.
+
+        Ohne Horizont wird nur switch_threshold berücksichtigt.
+        """
+
+        if self.horizon <= 0:
+            return self.switch_threshold
+
+        return max(self.switch_threshold, self.drain_cost / (self.horizon / 3600))
+
+    def project(self, moer_values: dict[str, float], forecast_values: dict[str, float] = None) -> dict[str, float]:
+        """
+        Nimmt die aktuellen MOER-Werte aller Nodes in den Verlauf auf und gibt ihre projizierten Werte zurück.
+
+        Nodes, für die kein MOER-Wert mehr ermittelt wird, werden vergessen.
+        """
+
+        now = self.clock()
+        forecast_values = forecast_values or {}
+        projected = {}
+
+        for node_name, moer_value in moer_values.items():
+            history = self._history.setdefault(node_name, collections.deque())
+            history.append((now, moer_value))
+
+            # Entfernen der Werte, die älter als der Horizont sind, der aktuelle Wert bleibt immer erhalten
+            while len(history) > 1 and history[0][0] <= now - self.horizon:
+                history.popleft()
+
+            if node_name in forecast_values:
+                projected[node_name] = forecast_values[node_name]
+            else:
+                projected[node_name] = sum(value for _, value in history) / len(history)
+
+        for node_name in self._history.keys() - moer_values.keys():
+            del self._history[node_name]
+            self._allowed.pop(node_name, None)
+            self._changed_at.pop(node_name, None)
+
+        return projected
+
+    def select(self, projected_values: dict[str, float], observed_states: dict[str, tuple], node_capacities: dict[str, tuple],
+               pod_requests: list[tuple], headroom= 0.2, min_nodes= 1, use_observed= True) -> list[str]:
+        """
+        Wählt die zulässigen Nodes anhand ihrer projizierten MOER-Werte mit select_nodes aus.
+
+        observed_states enthält je Node (zulässig, Zeitpunkt des letzten Wechsels oder None) wie im Cluster beobachtet.
+        Mit use_observed= False (Dry-Run) wird für bereits geplante Nodes der eigene Zustand verwendet.
+        """
+
+        now = self.clock()
+        margin = self.switch_margin
+
+        previous_allowed = {}
+        ranking = {}
+        pinned_allowed = []
+
+        for node_name, projected_value in projected_values.items():
+            allowed, changed_at = observed_states.get(node_name, (True, None))
+
+            if not use_observed and node_name in self._allowed:
+                allowed = self._allowed[node_name]
+                changed_at = self._changed_at.get(node_name, changed_at)
+
+            pinned = changed_at is not None and now - changed_at < self.min_dwell
+
+            previous_allowed[node_name] = allowed
+
+            # Festgehaltene zulässige Nodes werden immer ausgewählt, übrige zulässige Nodes erhalten einen Vorsprung
+            # und festgehaltene gesperrte Nodes werden nach allen anderen ausgewählt
+            if allowed and pinned:
+                pinned_allowed.append(node_name)
+                ranking[node_name] = projected_value
+            elif allowed:
+                ranking[node_name] = projected_value - margin
+            else:
+                ranking[node_name] = projected_value + (PINNED_OFFSET if pinned else 0)
+
+        selected = select_nodes(ranking, node_capacities, pod_requests, headroom= headroom, min_nodes= min_nodes, required_nodes= pinned_allowed)
+        selected_node_names = set(selected)
+
+        switches = collections.Counter()
+
+        for node_name, allowed in previous_allowed.items():
+            now_allowed = node_name in selected_node_names
+
+            if now_allowed != allowed:
+                self._changed_at[node_name] = now
+                switches["allowed" if now_allowed else "disallowed"] += 1
+
+            self._allowed[node_name] = now_allowed
+
+        for direction, count in switches.items():
+            metrics.NODE_SWITCHES.labels(direction).inc(count)
+
+        logger.info(f"Planner switches {switches['allowed']} nodes to allowed and {switches['disallowed']} to disallowed (margin {margin:.1f})")
+
+        return selected
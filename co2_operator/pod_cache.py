@@ -0,0 +1,185 @@
+import kubernetes
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PodCache:
+    """
+    Lokaler, durch einen Watch aktuell gehaltener Cache aller Pods im Cluster, indiziert nach Node-Namen.
+
+    Statt für jeden Node wiederholt alle Pods über die Kubernetes API aufzulisten, wird einmalig
+    eine Liste abgerufen und anschließend ein einzelner Watch auf alle Pods offen gehalten.
+    Wartende Threads werden geweckt, sobald sich die Pods eines Nodes ändern.
+    """
+
+    def __init__(self, k8s_api: kubernetes.client.CoreV1Api, watch_timeout= 300):
+        self.k8s_api = k8s_api
+        self.watch_timeout = watch_timeout
+
+        # Pods je Node (Node-Name -> Pod-UID -> Pod) und Zuordnung der Pod-UIDs zu ihrem Node
+        # Noch nicht eingeplante Pods werden unter dem Node-Namen None geführt
+        self._pods_by_node: dict[str, dict[str, kubernetes.client.V1Pod]] = {}
+        self._node_by_uid: dict[str, str] = {}
+
+        # Bedingung, über die wartende Threads bei Änderungen geweckt werden
+        self._condition = threading.Condition()
+
+        self._resource_version = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Lädt den initialen Zustand aller Pods und startet den Watch in einem Hintergrund-Thread.
+        """
+
+        # Der erste Abruf erfolgt synchron, damit der Cache direkt nach dem Start vollständig ist
+        self._relist()
+
+        self._thread = threading.Thread(target= self._run, name= "pod-cache", daemon= True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Beendet den Watch-Thread und weckt alle wartenden Threads.
+        """
+
+        self._stopped.set()
+
+        with self._condition:
+            self._condition.notify_all()
+
+    def pods_on_node(self, node_name: str) -> list[kubernetes.client.V1Pod]:
+        """
+        Gibt alle Pods zurück, die aktuell auf dem Node ausgeführt werden.
+        """
+
+        with self._condition:
+            return list(self._pods_by_node.get(node_name, {}).values())
+
+    def all_pods(self) -> list[kubernetes.client.V1Pod]:
+        """
+        Gibt alle Pods im Cluster zurück, einschließlich noch nicht eingeplanter Pods.
+        """
+
+        with self._condition:
+            return [pod for node_pods in self._pods_by_node.values() for pod in node_pods.values()]
+
+    def wait_until_empty(self, node_name: str, timeout= 300, ignore= None) -> bool:
+        """
+        Wartet, bis keine Pods mehr auf dem Node ausgeführt werden.
+
+        Pods, für die ignore(pod) True ergibt (z.B. DaemonSet-Pods), werden dabei nicht berücksichtigt.
+        Wenn timeout erreicht oder der Cache beendet wird und noch Pods auf dem Node laufen, wird False zurückgegeben.
+        """
+
+        def is_empty() -> bool:
+            pods = self._pods_by_node.get(node_name, {}).values()
+
+            return all(ignore(pod) for pod in pods) if ignore is not None else not pods
+
+        with self._condition:
+            self._condition.wait_for(lambda: is_empty() or self._stopped.is_set(), timeout= timeout)
+
+            return is_empty()
+
+    def _run(self):
+        """
+        Hält den Watch auf alle Pods offen und baut ihn nach Abbrüchen neu auf.
+        """
+
+        while not self._stopped.is_set():
+            try:
+                # Ist die letzte bekannte Version abgelaufen, muss der Zustand neu geladen werden
+                if self._resource_version is None:
+                    self._relist()
+
+                self._watch()
+            except kubernetes.client.exceptions.ApiException as e:
+                if e.status == 410:
+                    # Die Version ist zu alt für den API-Server, daher wird beim nächsten Durchlauf neu geladen
+                    logger.info("Pod watch expired, relisting pods...")
+                    self._resource_version = None
+                else:
+                    logger.error(f"Pod watch failed: {e}")
+                    self._stopped.wait(5)
+            except Exception as e:
+                # Netzwerkfehler dürfen den Cache nicht dauerhaft beenden
+                logger.error(f"Pod watch failed: {e}")
+                self._stopped.wait(5)
+
+    def _relist(self):
+        """
+        Ersetzt den gesamten Cache durch eine neue Liste aller Pods.
+        """
+
+        pod_list = self.k8s_api.list_pod_for_all_namespaces()
+
+        pods_by_node = {}
+        node_by_uid = {}
+
+        for pod in pod_list.items:
+            node_name = pod.spec.node_name or None
+
+            pods_by_node.setdefault(node_name, {})[pod.metadata.uid] = pod
+            node_by_uid[pod.metadata.uid] = node_name
+
+        with self._condition:
+            self._pods_by_node = pods_by_node
+            self._node_by_uid = node_by_uid
+            self._resource_version = pod_list.metadata.resource_version
+            self._condition.notify_all()
+
+    def _watch(self):
+        """
+        Verarbeitet die Ereignisse eines Watches, bis dieser vom API-Server beendet wird.
+        """
+
+        watch = kubernetes.watch.Watch()
+
+        for event in watch.stream(
+            self.k8s_api.list_pod_for_all_namespaces,
+            resource_version= self._resource_version,
+            timeout_seconds= self.watch_timeout,
+            allow_watch_bookmarks= True
+        ):
+            if self._stopped.is_set():
+                watch.stop()
+                break
+
+            # Lesezeichen enthalten nur die aktuelle Version und keine Pod-Änderung
+            if event["type"] == "BOOKMARK":
+                self._resource_version = event["raw_object"]["metadata"]["resourceVersion"]
+                continue
+
+            pod: kubernetes.client.V1Pod = event["object"]
+
+            self._apply(event["type"], pod)
+            self._resource_version = pod.metadata.resource_version
+
+    def _apply(self, event_type: str, pod: kubernetes.client.V1Pod):
+        """
+        Übernimmt ein einzelnes Watch-Ereignis in den Cache.
+        """
+
+        uid = pod.metadata.uid
+
+        with self._condition:
+            # Entfernen des Pods von seinem bisherigen Node
+            if uid in self._node_by_uid:
+                previous_node_name = self._node_by_uid.pop(uid)
+                node_pods = self._pods_by_node.get(previous_node_name, {})
+                node_pods.pop(uid, None)
+
+                if not node_pods:
+                    self._pods_by_node.pop(previous_node_name, None)
+
+            # Erneutes Eintragen des Pods, sofern er noch existiert
+            if event_type != "DELETED":
+                node_name = pod.spec.node_name or None
+
+                self._pods_by_node.setdefault(node_name, {})[uid] = pod
+                self._node_by_uid[uid] = node_name
+
+            self._condition.notify_all()
@@ -0,0 +1,129 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Reconciler:
+    """
+    Führt Optimierungszyklen ereignisgesteuert in einem eigenen Thread aus.
+
+    Ein Zyklus wird ausgelöst, wenn ein Ereignis angefordert wird (z.B. ein neuer oder nicht mehr
+    bereiter Node) oder spätestens nach interval Sekunden, damit neue MOER-Werte berücksichtigt werden.
+    Mehrere kurz aufeinanderfolgende Anforderungen werden zusammengefasst (Debounce): Der Zyklus startet erst,
+    wenn debounce Sekunden lang keine neue Anforderung eingegangen ist, spätestens aber nach max_delay Sekunden.
+    """
+
+    def __init__(self, reconcile, interval= 300, debounce= 10, max_delay= 60):
+        self.reconcile = reconcile
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        self._condition = threading.Condition()
+        self._stopped = False
+
+        # Gründe der ausstehenden Anforderungen sowie Zeitpunkt der ersten und letzten Anforderung
+        self._reasons: set[str] = set()
+        self._first_request_time = None
+        self._last_request_time = None
+
+        # Der erste Zyklus wird direkt nach dem Start ausgeführt
+        self._last_run_time = None
+
+        self._thread = None
+
+    def start(self):
+        """
+        Startet den Thread, der die Zyklen ausführt.
+        """
+
+        self._thread = threading.Thread(target= self._run, name= "reconciler", daemon= True)
+        self._thread.start()
+
+    def stop(self, timeout= None) -> bool:
+        """
+        Beendet den Thread, nachdem ein eventuell laufender Zyklus abgeschlossen ist.
+
+        Wartet höchstens timeout Sekunden auf den laufenden Zyklus und gibt zurück, ob der Thread beendet ist.
+        """
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+            return not self._thread.is_alive()
+
+        return True
+
+    def request(self, reason: str):
+        """
+        Fordert einen zusätzlichen Zyklus an.
+        """
+
+        with self._condition:
+            now = time.monotonic()
+
+            if not self._reasons:
+                self._first_request_time = now
+
+            self._reasons.add(reason)
+            self._last_request_time = now
+            self._condition.notify_all()
+
+    def _wait_for_trigger(self) -> set[str]:
+        """
+        Wartet, bis der nächste Zyklus fällig ist, und gibt die Gründe dafür zurück.
+
+        Gibt None zurück, wenn der Reconciler beendet wurde.
+        """
+
+        with self._condition:
+            while not self._stopped:
+                now = time.monotonic()
+
+                # Fälliger Zyklus durch das Intervall
+                if self._last_run_time is None or now - self._last_run_time >= self.interval:
+                    reasons = self._reasons or {"interval"}
+                    self._reasons = set()
+                    return reasons
+
+                # Ausstehende Anforderungen werden nach der Ruhezeit oder der maximalen Verzögerung ausgeführt
+                if self._reasons:
+                    due_time = min(self._last_request_time + self.debounce, self._first_request_time + self.max_delay)
+
+                    if now >= due_time:
+                        reasons = self._reasons
+                        self._reasons = set()
+                        return reasons
+                else:
+                    due_time = self._last_run_time + self.interval
+
+                self._condition.wait(min(due_time, self._last_run_time + self.interval) - now)
+
+            return None
+
+    def _run(self):
+        """
+        Führt Zyklen aus, bis der Reconciler beendet wird.
+        """
+
+        while True:
+            reasons = self._wait_for_trigger()
+
+            if reasons is None:
+                return
+
+            logger.info(f"Starting CO2-based node optimization cycle (triggered by: {', '.join(sorted(reasons))})")
+
+            try:
+                self.reconcile()
+            except Exception:
+                # Ein fehlgeschlagener Zyklus darf die folgenden Zyklen nicht verhindern
+                logger.exception("CO2-based node optimization cycle failed")
+
+            with self._condition:
+                self._last_run_time = time.monotonic()
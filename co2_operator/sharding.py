@@ -0,0 +1,302 @@
+import kubernetes
+import datetime
+import hashlib
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+def utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def shard_weight(member: str, node_name: str) -> int:
+    """
+    Gibt das Gewicht eines Replikats für einen Node zurück (Rendezvous-Hashing).
+
+    Der Hash ist im Gegensatz zu hash() in allen Prozessen gleich.
+    """
+
+    return int.from_bytes(hashlib.blake2b(f"{member}/{node_name}".encode(), digest_size= 8).digest(), "big")
+
+def owner_of(node_name: str, members: list[str]) -> str:
+    """
+    Gibt das Replikat zurück, das einen Node bearbeitet.
+
+    Jeder Node gehört dem Replikat mit dem höchsten Gewicht. Fällt ein Replikat aus, werden nur
+    dessen Nodes auf die übrigen Replikate verteilt, alle anderen Zuordnungen bleiben erhalten.
+    """
+
+    return max(members, key= lambda member: shard_weight(member, node_name))
+
+class ShardCoordinator:
+    """
+    Koordiniert mehrere Replikate des Operators über Lease-Objekte der Kubernetes API.
+
+    Jedes Replikat erneuert regelmäßig eine eigene Lease, deren Ablauf seinen Ausfall anzeigt. Über eine
+    gemeinsame Lease wird ein Leader gewählt, der die zulässigen und nicht zulässigen Nodes für den gesamten
+    Cluster berechnet und als Plan in einer ConfigMap veröffentlicht. Das Sperren, Evakuieren und Leeren
+    der Nodes wird per Rendezvous-Hashing des Node-Namens auf alle lebenden Replikate verteilt.
+    """
+
+    def __init__(self, coordination_api: kubernetes.client.CoordinationV1Api, k8s_api: kubernetes.client.CoreV1Api, namespace: str, identity: str,
+                 lease_duration= 15, renew_interval= 5, name= "co2-operator", on_change= None, clock= utc_now):
+        self.coordination_api = coordination_api
+        self.k8s_api = k8s_api
+        self.namespace = namespace
+        self.identity = identity
+        self.lease_duration = lease_duration
+        self.renew_interval = renew_interval
+        self.name = name
+        self.clock = clock
+
+        # Wird mit einem Grund aufgerufen, wenn sich die Replikate, der Leader oder der Plan ändern
+        self.on_change = on_change
+
+        self.leader_lease_name = f"{name}-leader"
+        self.member_lease_name = f"{name}-member-{identity}"
+        self.plan_name = f"{name}-plan"
+        self.member_labels = {"app.kubernetes.io/name": name, "co2-operator/lease": "member"}
+
+        self._lock = threading.Lock()
+        self._leader = False
+        self._leader_term = 0
+        self._members = [identity]
+        self._last_renewal = None
+        self._plan = None
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Meldet das Replikat an und startet den Thread, der die Leases regelmäßig erneuert.
+        """
+
+        self.renew()
+
+        self._thread = threading.Thread(target= self._run, name= "shard-coordinator", daemon= True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Beendet den Thread und gibt die Leases frei, damit die übrigen Replikate sofort übernehmen.
+        """
+
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        try:
+            self.coordination_api.delete_namespaced_lease(self.member_lease_name, self.namespace)
+
+            if self._leader:
+                self.coordination_api.patch_namespaced_lease(self.leader_lease_name, self.namespace, {"spec": {"holderIdentity": None}})
+        except kubernetes.client.exceptions.ApiException as e:
+            logger.error(f"Failed to release shard leases: {e}")
+
+    def is_leader(self) -> bool:
+        """
+        Prüft, ob dieses Replikat Leader ist und seine Lease noch nicht abgelaufen sein kann.
+        """
+
+        with self._lock:
+            return self._leader and self._last_renewal is not None and \
+                (self.clock() - self._last_renewal).total_seconds() < self.lease_duration
+
+    def leader_term(self) -> int:
+        """
+        Gibt die Anzahl der bisherigen Amtszeiten dieses Replikats als Leader zurück.
+        """
+
+        with self._lock:
+            return self._leader_term
+
+    def members(self) -> list[str]:
+        """
+        Gibt alle lebenden Replikate zurück.
+        """
+
+        with self._lock:
+            return list(self._members)
+
+    def owned_nodes(self, node_names) -> set[str]:
+        """
+        Gibt die Nodes zurück, die dieses Replikat bearbeitet.
+        """
+
+        members = self.members()
+
+        return {node_name for node_name in node_names if owner_of(node_name, members) == self.identity}
+
+    def renew(self):
+        """
+        Erneuert die eigene Lease, bewirbt sich um die Leader-Lease und ermittelt die lebenden Replikate.
+        """
+
+        now = self.clock()
+
+        self._renew_member_lease(now)
+        leader = self._acquire_leader_lease(now)
+        members = self._list_members(now)
+
+        # Nur Nicht-Leader lesen den Plan, der Leader kennt seinen eigenen
+        plan = self._plan if leader else self._read_plan()
+
+        with self._lock:
+            changes = []
+
+            if leader != self._leader:
+                changes.append("became shard leader" if leader else "lost shard leadership")
+
+            if members != self._members:
+                changes.append(f"shard members changed to {', '.join(members)}")
+
+            if not leader and plan is not None and (self._plan is None or plan["generation"] != self._plan["generation"]):
+                changes.append(f"new shard plan {plan['generation']}")
+
+            if leader and not self._leader:
+                self._leader_term += 1
+
+            self._leader = leader
+            self._members = members
+            self._plan = plan
+            self._last_renewal = now
+
+        for change in changes:
+            logger.info(f"Replica {self.identity}: {change}")
+
+            if self.on_change is not None:
+                self.on_change(change)
+
+    def publish_plan(self, nodes_to_allow: list[tuple], nodes_to_disallow: list[tuple]):
+        """
+        Veröffentlicht die zulässigen und nicht zulässigen Nodes (Node-Name, MOER-Wert) als Plan für alle Replikate.
+        """
+
+        with self._lock:
+            generation = self._plan["generation"] + 1 if self._plan is not None else 1
+
+        plan = {
+            "generation": generation,
+            "leader": self.identity,
+            "created": self.clock().isoformat(),
+            "allowed": dict(nodes_to_allow),
+            "disallowed": dict(nodes_to_disallow)
+        }
+
+        body = kubernetes.client.V1ConfigMap(
+            metadata= kubernetes.client.V1ObjectMeta(name= self.plan_name, namespace= self.namespace, labels= {"app.kubernetes.io/name": self.name}),
+            data= {"plan": json.dumps(plan)}
+        )
+
+        try:
+            self.k8s_api.replace_namespaced_config_map(self.plan_name, self.namespace, body)
+        except kubernetes.client.exceptions.ApiException as e:
+            if e.status != 404:
+                raise
+
+            self.k8s_api.create_namespaced_config_map(self.namespace, body)
+
+        with self._lock:
+            self._plan = plan
+
+    def current_plan(self) -> dict:
+        """
+        Gibt den zuletzt gelesenen oder veröffentlichten Plan zurück oder None, wenn noch keiner existiert.
+        """
+
+        with self._lock:
+            return self._plan
+
+    def _renew_member_lease(self, now: datetime.datetime):
+        spec = {"holderIdentity": self.identity, "leaseDurationSeconds": self.lease_duration, "renewTime": now}
+
+        try:
+            self.coordination_api.patch_namespaced_lease(self.member_lease_name, self.namespace, {"spec": spec})
+        except kubernetes.client.exceptions.ApiException as e:
+            if e.status != 404:
+                raise
+
+            self.coordination_api.create_namespaced_lease(self.namespace, kubernetes.client.V1Lease(
+                metadata= kubernetes.client.V1ObjectMeta(name= self.member_lease_name, namespace= self.namespace, labels= self.member_labels),
+                spec= kubernetes.client.V1LeaseSpec(holder_identity= self.identity, lease_duration_seconds= self.lease_duration, acquire_time= now, renew_time= now)
+            ))
+
+    def _acquire_leader_lease(self, now: datetime.datetime) -> bool:
+        try:
+            lease = self.coordination_api.read_namespaced_lease(self.leader_lease_name, self.namespace)
+        except kubernetes.client.exceptions.ApiException as e:
+            if e.status != 404:
+                raise
+
+            try:
+                self.coordination_api.create_namespaced_lease(self.namespace, kubernetes.client.V1Lease(
+                    metadata= kubernetes.client.V1ObjectMeta(name= self.leader_lease_name, namespace= self.namespace),
+                    spec= kubernetes.client.V1LeaseSpec(holder_identity= self.identity, lease_duration_seconds= self.lease_duration, acquire_time= now, renew_time= now, lease_transitions= 0)
+                ))
+                return True
+            except kubernetes.client.exceptions.ApiException as e:
+                # Ein anderes Replikat hat die Lease gleichzeitig erstellt
+                if e.status == 409:
+                    return False
+                raise
+
+        spec = lease.spec
+
+        if spec.holder_identity and spec.holder_identity != self.identity and not self._is_expired(spec, now):
+            return False
+
+        if spec.holder_identity != self.identity:
+            spec.acquire_time = now
+            spec.lease_transitions = (spec.lease_transitions or 0) + 1
+
+        spec.holder_identity = self.identity
+        spec.lease_duration_seconds = self.lease_duration
+        spec.renew_time = now
+
+        try:
+            # Die resourceVersion der gelesenen Lease verhindert, dass zwei Replikate gleichzeitig Leader werden
+            self.coordination_api.replace_namespaced_lease(self.leader_lease_name, self.namespace, lease)
+        except kubernetes.client.exceptions.ApiException as e:
+            if e.status == 409:
+                return False
+            raise
+
+        return True
+
+    def _list_members(self, now: datetime.datetime) -> list[str]:
+        label_selector = ",".join(f"{key}={value}" for key, value in self.member_labels.items())
+        leases = self.coordination_api.list_namespaced_lease(self.namespace, label_selector= label_selector).items
+
+        members = {lease.spec.holder_identity for lease in leases if lease.spec.holder_identity and not self._is_expired(lease.spec, now)}
+
+        # Das eigene Replikat ist immer beteiligt, auch wenn seine Lease noch nicht sichtbar ist
+        members.add(self.identity)
+
+        return sorted(members)
+
+    def _read_plan(self) -> dict:
+        try:
+            config_map = self.k8s_api.read_namespaced_config_map(self.plan_name, self.namespace)
+        except kubernetes.client.exceptions.ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+
+        return json.loads(config_map.data["plan"])
+
+    def _is_expired(self, spec: kubernetes.client.V1LeaseSpec, now: datetime.datetime) -> bool:
+        if spec.renew_time is None:
+            return True
+
+        return (now - spec.renew_time).total_seconds() >= (spec.lease_duration_seconds or self.lease_duration)
+
+    def _run(self):
+        while not self._stopped.wait(self.renew_interval):
+            try:
+                self.renew()
+            except Exception:
+                # Bei einem Fehler läuft die eigene Leader-Lease ab, siehe is_leader()
+                logger.exception("Failed to renew shard leases")
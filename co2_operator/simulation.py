@@ -0,0 +1,584 @@
+import kubernetes
+import kopf
+import csv
+import heapq
+import random
+import threading
+import time
+import collections
+import contextlib
+import logging
+from co2_operator.drain import DrainExecutor
+from co2_operator.eviction import EvictionEngine
+from co2_operator.pod_cache import PodCache
+from co2_operator.metric_sink import MetricSink
+from co2_operator.node_state import NodeStateStore
+from co2_operator.moer import MoerProvider, SimulatedMoerProvider
+from co2_operator.sharding import ShardCoordinator
+from co2_operator.planner import HysteresisPlanner
+
+logger = logging.getLogger(__name__)
+
+# Gemeinsame Konfiguration für alle simulierten Kubernetes-Objekte
+# Ohne sie würde jedes Objekt eine eigene Kopie der Standardkonfiguration erzeugen
+model_configuration = kubernetes.client.Configuration()
+model_configuration.client_side_validation = False
+
+class FakeCoreV1Api:
+    """
+    In-Memory-Ersatz für kubernetes.client.CoreV1Api mit Nodes, Pods und Evakuierungen.
+
+    Evakuierte Pods werden nach eviction_latency Sekunden gelöscht und, wie durch einen ReplicaSet,
+    auf einem zufälligen zulässigen Node neu erstellt. Mit eviction_failure_rate wird der Anteil der
+    Evakuierungen, die wie durch ein PodDisruptionBudget mit 429 abgelehnt werden, festgelegt.
+    Jeder Aufruf wird in calls gezählt und kann mit api_latency Sekunden künstlich verzögert werden.
+    """
+
+    def __init__(self, node_count: int, pods_per_node= 10, eviction_latency= 0.0, api_latency= 0.0,
+                 node_allocatable= None, pod_requests= None, eviction_failure_rate= 0.0):
+        self.eviction_latency = eviction_latency
+        self.api_latency = api_latency
+        self.eviction_failure_rate = eviction_failure_rate
+
+        self.node_allocatable = node_allocatable or {"cpu": "8", "memory": "32Gi", "pods": "110"}
+        self.pod_requests = pod_requests or {"cpu": "500m", "memory": "1Gi"}
+
+        # Anzahl der Aufrufe je API-Methode
+        self.calls = collections.Counter()
+
+        self._lock = threading.RLock()
+        self._resource_version = 0
+        self._pod_counter = 0
+        self._pod_listeners = []
+
+        self.nodes: dict[str, kubernetes.client.V1Node] = {}
+        self.pods: dict[str, kubernetes.client.V1Pod] = {}
+        self.config_maps: dict[tuple, kubernetes.client.V1ConfigMap] = {}
+
+        # Liste der zulässigen Nodes mit Index für das Entfernen in konstanter Zeit
+        self._schedulable_node_names: list[str] = []
+        self._schedulable_index: dict[str, int] = {}
+
+        # Geplante Löschungen evakuierter Pods (Fälligkeit, Pod-UID)
+        self._pending_deletions = []
+        self._deletion_condition = threading.Condition(self._lock)
+        self._stopped = False
+
+        for i in range(node_count):
+            node_name = f"node-{i:05d}"
+            self.nodes[node_name] = self._create_node(node_name)
+            self._set_schedulable(node_name, True)
+
+            for _ in range(pods_per_node):
+                pod = self._create_pod(node_name)
+                self.pods[pod.metadata.uid] = pod
+
+        self._deletion_thread = threading.Thread(target= self._run_deletions, name= "fake-evictions", daemon= True)
+        self._deletion_thread.start()
+
+    def stop(self):
+        """
+        Beendet den Thread, der evakuierte Pods löscht.
+        """
+
+        with self._lock:
+            self._stopped = True
+            self._deletion_condition.notify_all()
+
+    def add_pod_listener(self, listener):
+        """
+        Registriert eine Funktion, die bei jeder Pod-Änderung mit (Ereignistyp, Pod) aufgerufen wird.
+        """
+
+        self._pod_listeners.append(listener)
+
+    def list_node(self, **_) -> kubernetes.client.V1NodeList:
+        self._call("list_node")
+
+        with self._lock:
+            return kubernetes.client.V1NodeList(items= list(self.nodes.values()), local_vars_configuration= model_configuration)
+
+    def patch_node(self, name: str, body: dict, dry_run= None, **_):
+        self._call("patch_node")
+
+        if dry_run is not None:
+            return self.nodes[name]
+
+        with self._lock:
+            unschedulable = body.get("spec", {}).get("unschedulable")
+            annotations = body.get("metadata", {}).get("annotations")
+
+            if annotations:
+                self.nodes[name].metadata.annotations = {**(self.nodes[name].metadata.annotations or {}), **annotations}
+
+            if unschedulable is not None:
+                self.nodes[name].spec.unschedulable = unschedulable
+                self._set_schedulable(name, not unschedulable)
+
+            return self.nodes[name]
+
+    def list_pod_for_all_namespaces(self, field_selector= None, **_) -> kubernetes.client.V1PodList:
+        self._call("list_pod_for_all_namespaces")
+
+        with self._lock:
+            pods = list(self.pods.values())
+
+            if field_selector is not None and field_selector.startswith("spec.nodeName="):
+                node_name = field_selector[len("spec.nodeName="):]
+                pods = [pod for pod in pods if pod.spec.node_name == node_name]
+
+            return kubernetes.client.V1PodList(
+                items= pods,
+                metadata= kubernetes.client.V1ListMeta(resource_version= str(self._resource_version), local_vars_configuration= model_configuration),
+                local_vars_configuration= model_configuration
+            )
+
+    def create_namespaced_pod_eviction(self, name: str, namespace: str, body, dry_run= None, **_):
+        self._call("create_namespaced_pod_eviction")
+
+        if random.random() < self.eviction_failure_rate:
+            raise kubernetes.client.exceptions.ApiException(status= 429, reason= "Too Many Requests")
+
+        if dry_run is not None:
+            return
+
+        with self._lock:
+            uid = next((pod.metadata.uid for pod in self._pods_named(name, namespace)), None)
+
+            if uid is None:
+                raise kubernetes.client.exceptions.ApiException(status= 404, reason= "Not Found")
+
+            if self.eviction_latency <= 0:
+                self._delete_pod(uid)
+            else:
+                heapq.heappush(self._pending_deletions, (time.monotonic() + self.eviction_latency, uid))
+                self._deletion_condition.notify_all()
+
+    def read_namespaced_config_map(self, name: str, namespace: str, **_) -> kubernetes.client.V1ConfigMap:
+        self._call("read_namespaced_config_map")
+
+        with self._lock:
+            if (namespace, name) not in self.config_maps:
+                raise kubernetes.client.exceptions.ApiException(status= 404, reason= "Not Found")
+
+            return self.config_maps[(namespace, name)]
+
+    def create_namespaced_config_map(self, namespace: str, body: kubernetes.client.V1ConfigMap, **_) -> kubernetes.client.V1ConfigMap:
+        self._call("create_namespaced_config_map")
+
+        with self._lock:
+            if (namespace, body.metadata.name) in self.config_maps:
+                raise kubernetes.client.exceptions.ApiException(status= 409, reason= "Conflict")
+
+            body.metadata.resource_version = self._next_resource_version()
+            self.config_maps[(namespace, body.metadata.name)] = body
+            return body
+
+    def replace_namespaced_config_map(self, name: str, namespace: str, body: kubernetes.client.V1ConfigMap, **_) -> kubernetes.client.V1ConfigMap:
+        self._call("replace_namespaced_config_map")
+
+        with self._lock:
+            if (namespace, name) not in self.config_maps:
+                raise kubernetes.client.exceptions.ApiException(status= 404, reason= "Not Found")
+
+            body.metadata.resource_version = self._next_resource_version()
+            self.config_maps[(namespace, name)] = body
+            return body
+
+    def _pods_named(self, name: str, namespace: str):
+        # Die Namen der simulierten Pods enthalten ihre UID, daher ist keine Suche über alle Pods nötig
+        pod = self.pods.get(name)
+
+        if pod is not None and pod.metadata.namespace == namespace:
+            yield pod
+
+    def _call(self, method: str):
+        self.calls[method] += 1
+
+        if self.api_latency > 0:
+            time.sleep(self.api_latency)
+
+    def _set_schedulable(self, node_name: str, schedulable: bool):
+        if schedulable and node_name not in self._schedulable_index:
+            self._schedulable_index[node_name] = len(self._schedulable_node_names)
+            self._schedulable_node_names.append(node_name)
+        elif not schedulable and node_name in self._schedulable_index:
+            # Tauschen mit dem letzten Eintrag, um in konstanter Zeit zu entfernen
+            index = self._schedulable_index.pop(node_name)
+            last_node_name = self._schedulable_node_names.pop()
+
+            if last_node_name != node_name:
+                self._schedulable_node_names[index] = last_node_name
+                self._schedulable_index[last_node_name] = index
+
+    def _next_resource_version(self) -> str:
+        self._resource_version += 1
+        return str(self._resource_version)
+
+    def _create_node(self, node_name: str) -> kubernetes.client.V1Node:
+        return kubernetes.client.V1Node(
+            metadata= kubernetes.client.V1ObjectMeta(name= node_name, resource_version= self._next_resource_version(), local_vars_configuration= model_configuration),
+            spec= kubernetes.client.V1NodeSpec(unschedulable= False, local_vars_configuration= model_configuration),
+            status= kubernetes.client.V1NodeStatus(
+                allocatable= dict(self.node_allocatable),
+                conditions= [kubernetes.client.V1NodeCondition(type= "Ready", status= "True", local_vars_configuration= model_configuration)],
+                local_vars_configuration= model_configuration
+            ),
+            local_vars_configuration= model_configuration
+        )
+
+    def _create_pod(self, node_name: str) -> kubernetes.client.V1Pod:
+        self._pod_counter += 1
+        uid = f"pod-{self._pod_counter:07d}"
+
+        return kubernetes.client.V1Pod(
+            metadata= kubernetes.client.V1ObjectMeta(name= uid, namespace= "default", uid= uid, resource_version= self._next_resource_version(), local_vars_configuration= model_configuration),
+            spec= kubernetes.client.V1PodSpec(
+                node_name= node_name,
+                containers= [kubernetes.client.V1Container(
+                    name= "app",
+                    resources= kubernetes.client.V1ResourceRequirements(requests= dict(self.pod_requests), local_vars_configuration= model_configuration),
+                    local_vars_configuration= model_configuration
+                )],
+                local_vars_configuration= model_configuration
+            ),
+            status= kubernetes.client.V1PodStatus(phase= "Running", local_vars_configuration= model_configuration),
+            local_vars_configuration= model_configuration
+        )
+
+    def _delete_pod(self, uid: str):
+        pod = self.pods.pop(uid, None)
+
+        if pod is None:
+            return
+
+        pod.metadata.resource_version = self._next_resource_version()
+        self._notify("DELETED", pod)
+
+        # Neu erstellen des Pods auf einem zufälligen zulässigen Node
+        if self._schedulable_node_names:
+            replacement = self._create_pod(random.choice(self._schedulable_node_names))
+            self.pods[replacement.metadata.uid] = replacement
+            self._notify("ADDED", replacement)
+
+    def _notify(self, event_type: str, pod: kubernetes.client.V1Pod):
+        for listener in self._pod_listeners:
+            listener(event_type, pod)
+
+    def _run_deletions(self):
+        with self._lock:
+            while not self._stopped:
+                now = time.monotonic()
+
+                while self._pending_deletions and self._pending_deletions[0][0] <= now:
+                    _, uid = heapq.heappop(self._pending_deletions)
+                    self._delete_pod(uid)
+
+                timeout = self._pending_deletions[0][0] - now if self._pending_deletions else None
+                self._deletion_condition.wait(timeout)
+
+class FakeCoordinationV1Api:
+    """
+    In-Memory-Ersatz für kubernetes.client.CoordinationV1Api mit Lease-Objekten.
+
+    Wie bei der echten API schlägt das Ersetzen einer Lease mit veralteter resourceVersion mit 409 fehl.
+    Gelesene Leases sind Kopien, damit Änderungen erst mit dem Schreiben sichtbar werden.
+    """
+
+    def __init__(self):
+        self.calls = collections.Counter()
+
+        self._lock = threading.Lock()
+        self._resource_version = 0
+        self.leases: dict[tuple, kubernetes.client.V1Lease] = {}
+
+    def read_namespaced_lease(self, name: str, namespace: str, **_) -> kubernetes.client.V1Lease:
+        self.calls["read_namespaced_lease"] += 1
+
+        with self._lock:
+            return self._copy(self._get(name, namespace))
+
+    def list_namespaced_lease(self, namespace: str, label_selector= None, **_) -> kubernetes.client.V1LeaseList:
+        self.calls["list_namespaced_lease"] += 1
+
+        labels = dict(item.split("=", 1) for item in label_selector.split(",")) if label_selector else {}
+
+        with self._lock:
+            items = [
+                self._copy(lease) for (lease_namespace, _), lease in self.leases.items()
+                if lease_namespace == namespace and labels.items() <= (lease.metadata.labels or {}).items()
+            ]
+
+        return kubernetes.client.V1LeaseList(items= items, local_vars_configuration= model_configuration)
+
+    def create_namespaced_lease(self, namespace: str, body: kubernetes.client.V1Lease, **_) -> kubernetes.client.V1Lease:
+        self.calls["create_namespaced_lease"] += 1
+
+        with self._lock:
+            if (namespace, body.metadata.name) in self.leases:
+                raise kubernetes.client.exceptions.ApiException(status= 409, reason= "Conflict")
+
+            return self._store(namespace, self._copy(body))
+
+    def replace_namespaced_lease(self, name: str, namespace: str, body: kubernetes.client.V1Lease, **_) -> kubernetes.client.V1Lease:
+        self.calls["replace_namespaced_lease"] += 1
+
+        with self._lock:
+            current = self._get(name, namespace)
+
+            if body.metadata.resource_version is not None and body.metadata.resource_version != current.metadata.resource_version:
+                raise kubernetes.client.exceptions.ApiException(status= 409, reason= "Conflict")
+
+            return self._store(namespace, self._copy(body))
+
+    def patch_namespaced_lease(self, name: str, namespace: str, body: dict, **_) -> kubernetes.client.V1Lease:
+        self.calls["patch_namespaced_lease"] += 1
+
+        # Zuordnung der JSON-Feldnamen (z.B. "renewTime") zu den Attributen von V1LeaseSpec
+        attributes = {json_name: attribute for attribute, json_name in kubernetes.client.V1LeaseSpec.attribute_map.items()}
+
+        with self._lock:
+            lease = self._copy(self._get(name, namespace))
+
+            for json_name, value in body.get("spec", {}).items():
+                setattr(lease.spec, attributes[json_name], value)
+
+            return self._store(namespace, lease)
+
+    def delete_namespaced_lease(self, name: str, namespace: str, **_):
+        self.calls["delete_namespaced_lease"] += 1
+
+        with self._lock:
+            self._get(name, namespace)
+            del self.leases[(namespace, name)]
+
+    def _get(self, name: str, namespace: str) -> kubernetes.client.V1Lease:
+        if (namespace, name) not in self.leases:
+            raise kubernetes.client.exceptions.ApiException(status= 404, reason= "Not Found")
+
+        return self.leases[(namespace, name)]
+
+    def _store(self, namespace: str, lease: kubernetes.client.V1Lease) -> kubernetes.client.V1Lease:
+        self._resource_version += 1
+        lease.metadata.resource_version = str(self._resource_version)
+        self.leases[(namespace, lease.metadata.name)] = lease
+
+        return self._copy(lease)
+
+    def _copy(self, lease: kubernetes.client.V1Lease) -> kubernetes.client.V1Lease:
+        return kubernetes.client.V1Lease(
+            metadata= kubernetes.client.V1ObjectMeta(
+                name= lease.metadata.name,
+                namespace= lease.metadata.namespace,
+                labels= dict(lease.metadata.labels or {}),
+                resource_version= lease.metadata.resource_version,
+                local_vars_configuration= model_configuration
+            ),
+            spec= kubernetes.client.V1LeaseSpec(
+                holder_identity= lease.spec.holder_identity,
+                lease_duration_seconds= lease.spec.lease_duration_seconds,
+                acquire_time= lease.spec.acquire_time,
+                renew_time= lease.spec.renew_time,
+                lease_transitions= lease.spec.lease_transitions,
+                local_vars_configuration= model_configuration
+            ),
+            local_vars_configuration= model_configuration
+        )
+
+class SimulatedPodCache(PodCache):
+    """
+    PodCache, der statt eines Watches direkt über die Änderungen der FakeCoreV1Api informiert wird.
+    """
+
+    def start(self):
+        self._relist()
+        self.k8s_api.add_pod_listener(self._apply)
+
+class FakeCopy:
+    """
+    Ersatz für psycopg.Copy, der die geschriebenen Zeilen in einer Liste sammelt.
+    """
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def write_row(self, row: tuple):
+        self.rows.append(row)
+
+class FakeCursor:
+    """
+    Ersatz für psycopg.Cursor, der jede Anweisung als Datenbank-Roundtrip zählt.
+    """
+
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+
+    def execute(self, query, params= None):
+        self.connection.round_trips += 1
+        return self
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    @contextlib.contextmanager
+    def copy(self, statement: str):
+        self.connection.round_trips += 1
+
+        # Der Tabellenname folgt direkt auf "COPY"
+        table = statement.split()[1]
+        yield FakeCopy(self.connection.tables[table])
+
+class FakeConnection:
+    """
+    In-Memory-Ersatz für psycopg.Connection.
+
+    Per COPY geschriebene Zeilen werden je Tabelle in tables gesammelt, alle Datenbank-Roundtrips in round_trips gezählt.
+    """
+
+    def __init__(self):
+        self.tables = collections.defaultdict(list)
+        self.round_trips = 0
+
+        # Die Verbindung bricht nie ab
+        self.closed = False
+        self.broken = False
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def commit(self):
+        self.round_trips += 1
+
+    def rollback(self):
+        self.round_trips += 1
+
+    def close(self):
+        self.closed = True
+
+class ReplayMoerProvider(MoerProvider):
+    """
+    Spielt die aufgezeichneten MOER-Werte aus einem Datensatz (z.B. datasets/*.csv) erneut ab.
+
+    Jeder simulierte Node wird reihum einem Node des Datensatzes zugeordnet. Mit jedem Abruf wird
+    der nächste aufgezeichnete Wert dieses Nodes zurückgegeben; am Ende beginnt die Aufzeichnung von vorn.
+    """
+
+    def __init__(self, path: str):
+        traces = collections.defaultdict(list)
+
+        with open(path, newline= "") as file:
+            for row in csv.DictReader(file):
+                if row["value_type"] == "MOER":
+                    traces[row["node_name"]].append(float(row["value"]))
+
+        if not traces:
+            raise ValueError(f"No MOER values found in {path}")
+
+        self.traces = [traces[node_name] for node_name in sorted(traces)]
+
+        # Zuordnung der simulierten Nodes zu einer Aufzeichnung und Anzahl der bisherigen Abrufe
+        self.assignments: dict[str, list[float]] = {}
+        self.steps = 0
+
+    def get_moer_values(self, node_locations: dict[str, dict]) -> dict[str, float]:
+        moer_values = {}
+
+        for node_name in node_locations:
+            if node_name not in self.assignments:
+                self.assignments[node_name] = self.traces[len(self.assignments) % len(self.traces)]
+
+            trace = self.assignments[node_name]
+            moer_values[node_name] = trace[self.steps % len(trace)]
+
+        self.steps += 1
+
+        return moer_values
+
+class SimulatedClock:
+    """
+    Uhr des simulierten Operators, die mit advance() weitergestellt wird, z.B. um das Intervall eines Zyklus.
+    """
+
+    def __init__(self, start= 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+def create_simulation(node_count: int, pods_per_node= 10, eviction_latency= 0.0, api_latency= 0.0, trace_path= None,
+                      drain_max_in_flight= 10, drain_node_timeout= 300, placement_headroom= 0.2, placement_min_nodes= 1,
+                      eviction_failure_rate= 0.0, eviction_qps= 0.0, eviction_burst= 40, eviction_max_in_flight= 20,
+                      planner_horizon= 3600, planner_min_dwell= 1800, planner_switch_threshold= 5.0, planner_drain_cost= 5.0,
+                      k8s_api: FakeCoreV1Api = None) -> kopf.Memo:
+    """
+    Erstellt einen vollständig simulierten Operator, dessen Zyklen mit co2_operator.cycle.reconcile ausgeführt werden können.
+
+    Enthält die gleichen Einträge wie das memo des echten Operators, jedoch mit FakeCoreV1Api und FakeConnection.
+    Mit k8s_api teilen sich mehrere simulierte Replikate denselben Cluster.
+    Die Evakuierungen sind standardmäßig nicht begrenzt (eviction_qps= 0), damit die Messung nur den Operator erfasst.
+    Der Planer verwendet die simulierte Uhr memo.clock, die zwischen den Zyklen weitergestellt werden muss.
+    """
+
+    memo = kopf.Memo()
+
+    memo.k8s_api = k8s_api or FakeCoreV1Api(node_count, pods_per_node= pods_per_node, eviction_latency= eviction_latency, api_latency= api_latency,
+                                            eviction_failure_rate= eviction_failure_rate)
+
+    memo.pod_cache = SimulatedPodCache(memo.k8s_api)
+    memo.pod_cache.start()
+
+    # Kurze Wartezeiten, damit abgelehnte Evakuierungen auch in der Simulation schnell wiederholt werden
+    memo.eviction_engine = EvictionEngine(memo.k8s_api, qps= eviction_qps, burst= eviction_burst, max_in_flight= eviction_max_in_flight,
+                                          base_backoff= 0.01, max_backoff= 0.5)
+    memo.drain_executor = DrainExecutor(memo.k8s_api, memo.pod_cache, max_in_flight= drain_max_in_flight, node_timeout= drain_node_timeout,
+                                        eviction_engine= memo.eviction_engine)
+    memo.moer_provider = ReplayMoerProvider(trace_path) if trace_path else SimulatedMoerProvider()
+
+    memo.clock = SimulatedClock(time.time())
+    memo.planner = HysteresisPlanner(
+        horizon= planner_horizon,
+        min_dwell= planner_min_dwell,
+        switch_threshold= planner_switch_threshold,
+        drain_cost= planner_drain_cost,
+        clock= memo.clock
+    )
+
+    memo.sink = MetricSink(FakeConnection())
+    memo.state = NodeStateStore(memo.sink)
+
+    memo.dry_run = None
+    memo.ignored_node_names = []
+    memo.simulate_no_operator = False
+    memo.metric_retention_days = 0
+    memo.placement_headroom = placement_headroom
+    memo.placement_min_nodes = placement_min_nodes
+
+    memo.coordinator = None
+    memo.owned_node_names = None
+
+    return memo
+
+def create_sharded_simulation(node_count: int, replicas: int, lease_duration= 15, k8s_api: FakeCoreV1Api = None, **simulation_options) -> list[kopf.Memo]:
+    """
+    Erstellt mehrere simulierte Replikate, die sich einen Cluster teilen und über FakeCoordinationV1Api koordinieren.
+
+    Die ShardCoordinator der Replikate werden nicht gestartet, ihre Leases werden mit coordinator.renew() erneuert.
+    Jedes Replikat hat eine eigene FakeConnection, die Einträge aller Replikate ergeben zusammen die Datenbank.
+    Mit k8s_api wird ein bereits erstellter Cluster verwendet.
+    """
+
+    memos = [create_simulation(node_count, k8s_api= k8s_api, **simulation_options)]
+    memos += [create_simulation(node_count, k8s_api= memos[0].k8s_api, **simulation_options) for _ in range(replicas - 1)]
+
+    coordination_api = FakeCoordinationV1Api()
+
+    for i, memo in enumerate(memos):
+        memo.coordinator = ShardCoordinator(coordination_api, memo.k8s_api, "default", f"replica-{i}", lease_duration= lease_duration)
+
+    return memos
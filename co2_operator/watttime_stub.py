@@ -0,0 +1,160 @@
+import argparse
+import collections
+import datetime
+import http.server
+import json
+import logging
+import sys
+import threading
+import urllib.parse
+import watttime
+from co2_operator.moer import WattTimeMoerProvider
+
+logger = logging.getLogger(__name__)
+
+class WattTimeStubServer(http.server.ThreadingHTTPServer):
+    """
+    Lokaler Ersatz für die WattTime API, gegen den der Operator über WATTTIME_URL_BASE getestet werden kann.
+
+    Beantwortet /login, /v3/region-from-loc und /v3/forecast und zählt alle Aufrufe je Pfad in calls.
+    Die Region einer Koordinate ergibt sich aus dem gerundeten Breitengrad, die Vorhersage enthält einen
+    Punkt alle 5 Minuten ab dem Beginn des aktuellen Intervalls.
+    """
+
+    def __init__(self, address: tuple):
+        super().__init__(address, WattTimeStubHandler)
+
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+
+    def count(self, path: str):
+        with self._lock:
+            self.calls[path] += 1
+
+    @property
+    def url_base(self) -> str:
+        host, port = self.server_address[:2]
+
+        return f"http://{host}:{port}"
+
+class WattTimeStubHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Beantwortet die Anfragen des WattTime-Clients für WattTimeStubServer.
+    """
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+
+        self.server.count(url.path)
+
+        if url.path == "/login":
+            self.send_json({"token": "stub"})
+        elif url.path == "/v3/region-from-loc":
+            region = f"STUB_{round(float(params['latitude']))}"
+            self.send_json({"region": region, "region_full_name": region, "signal_type": params.get("signal_type")})
+        elif url.path == "/v3/forecast":
+            self.send_json(get_forecast(params["region"], int(params.get("horizon_hours", 0))))
+        else:
+            self.send_error(404)
+
+    def send_json(self, body: dict):
+        data = json.dumps(body).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Jeder einzelne Aufruf würde die Ausgabe überfluten
+        pass
+
+def get_forecast(region: str, horizon_hours: int) -> dict:
+    """
+    Erstellt eine Vorhersage mit einem Punkt alle 5 Minuten über mindestens eine Stunde, deren Werte von der Region abhängen.
+    """
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    start = now.replace(minute= now.minute - now.minute % 5, second= 0, microsecond= 0)
+    base_value = 25 + sum(region.encode()) % 50
+
+    return {
+        "data": [
+            {"point_time": (start + datetime.timedelta(minutes= 5 * i)).isoformat(), "value": base_value + i % 6}
+            for i in range(max(horizon_hours, 1) * 12)
+        ],
+        "meta": {"region": region, "signal_type": "co2_moer", "units": "lbs_co2_per_mwh"}
+    }
+
+def start_server(port= 0) -> WattTimeStubServer:
+    """
+    Startet den Stub-Server in einem Hintergrund-Thread, bei port= 0 auf einem freien Port.
+    """
+
+    server = WattTimeStubServer(("127.0.0.1", port))
+    threading.Thread(target= server.serve_forever, name= "watttime-stub", daemon= True).start()
+
+    return server
+
+def check_provider(node_count: int, region_count: int, horizon_hours= 1, max_workers= 8) -> collections.Counter:
+    """
+    Fragt die MOER-Werte und Vorhersagen von node_count Nodes in region_count Regionen zweimal über WattTimeMoerProvider
+    beim Stub-Server ab und gibt die Anzahl der Aufrufe je Pfad zurück.
+
+    Erwartet werden eine Anmeldung sowie je Region ein Aufruf von /v3/region-from-loc und /v3/forecast,
+    da der zweite Abruf aus dem Zwischenspeicher beantwortet wird.
+    """
+
+    server = start_server()
+
+    try:
+        wt_api = watttime.WattTimeForecast("stub", "stub")
+        wt_api.url_base = server.url_base
+
+        provider = WattTimeMoerProvider(wt_api, horizon_hours= horizon_hours, max_workers= max_workers)
+        node_locations = {f"node-{i:05d}": {"lat": i % region_count, "lng": 0} for i in range(node_count)}
+
+        for _ in range(2):
+            moer_values = provider.get_moer_values(node_locations)
+            provider.get_forecast_values(node_locations, horizon_hours * 3600)
+
+            if len(moer_values) != node_count:
+                logger.error(f"Only {len(moer_values)} of {node_count} nodes received a MOER value")
+
+        return server.calls
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def main(argv= None):
+    """
+    Startet den Stub-Server oder prüft mit --check die Anzahl der API-Aufrufe von WattTimeMoerProvider.
+    """
+
+    parser = argparse.ArgumentParser(description= "Local stub of the WattTime API for testing the CO2-Operator")
+    parser.add_argument("--port", type= int, default= 8080, help= "port to serve on")
+    parser.add_argument("--check", action= "store_true", help= "query the stub through WattTimeMoerProvider and print the calls per endpoint")
+    parser.add_argument("--nodes", type= int, default= 30, help= "nodes queried with --check")
+    parser.add_argument("--regions", type= int, default= 3, help= "regions of the nodes queried with --check")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(stream= sys.stdout, level= logging.WARNING)
+
+    if args.check:
+        calls = check_provider(args.nodes, args.regions)
+
+        for path, count in sorted(calls.items()):
+            print(f"{path:<22} {count:>6}")
+
+        # Mehr als eine Anmeldung oder mehr als ein Aufruf je Region deutet auf fehlendes Zwischenspeichern hin
+        expected = {"/login": 1, "/v3/region-from-loc": args.regions, "/v3/forecast": args.regions}
+        sys.exit(0 if dict(calls) == expected else 1)
+
+    server = WattTimeStubServer(("127.0.0.1", args.port))
+    print(f"Serving the WattTime stub on {server.url_base}, set WATTTIME_URL_BASE to this address")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Verzeichnis, in dem die spaltenweise zwischengespeicherten Datensätze abgelegt werden
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+# Version des Cache-Formats, bei Änderungen werden alle Caches neu erstellt
+CACHE_VERSION = 1
+
+def source_signature(path: str) -> dict:
+    """
+    Erstellt eine Signatur der Quelldatei, anhand derer ein veralteter Cache erkannt wird.
+    """
+
+    stat = os.stat(path)
+
+    return {'version': CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def write_cache(df: pd.DataFrame, cache_path: str, signature: dict) -> None:
+    """
+    Speichert einen Datensatz spaltenweise als NumPy-Dateien.
+
+    Textspalten werden als Kategorien (Codes und Werte) gespeichert, Zeitstempel als Nanosekunden.
+    """
+
+    os.makedirs(cache_path, exist_ok=True)
+
+    node_names = pd.Categorical(df['node_name'])
+    value_types = pd.Categorical(df['value_type'])
+
+    np.save(os.path.join(cache_path, 'node_name_codes.npy'), node_names.codes)
+    np.save(os.path.join(cache_path, 'node_name_categories.npy'), np.asarray(node_names.categories, dtype=str))
+    np.save(os.path.join(cache_path, 'value_type_codes.npy'), value_types.codes)
+    np.save(os.path.join(cache_path, 'value_type_categories.npy'), np.asarray(value_types.categories, dtype=str))
+    np.save(os.path.join(cache_path, 'timestamp.npy'), pd.to_datetime(df['timestamp']).to_numpy(dtype='datetime64[ns]'))
+    np.save(os.path.join(cache_path, 'value.npy'), df['value'].to_numpy(dtype='float64'))
+
+    # Die Signatur wird zuletzt geschrieben, damit ein abgebrochener Schreibvorgang nicht als gültiger Cache gilt
+    with open(os.path.join(cache_path, 'signature.json'), 'w') as file:
+        json.dump(signature, file)
+
+def read_cache(cache_path: str, signature: dict) -> pd.DataFrame:
+    """
+    Liest einen zwischengespeicherten Datensatz per Memory-Mapping oder gibt None zurück, wenn er fehlt oder veraltet ist.
+    """
+
+    try:
+        with open(os.path.join(cache_path, 'signature.json')) as file:
+            if json.load(file) != signature:
+                return None
+    except (OSError, ValueError):
+        return None
+
+    def load(name: str) -> np.ndarray:
+        return np.load(os.path.join(cache_path, f'{name}.npy'), mmap_mode='r')
+
+    return pd.DataFrame({
+        'node_name': pd.Categorical.from_codes(load('node_name_codes'), categories=load('node_name_categories')),
+        'value_type': pd.Categorical.from_codes(load('value_type_codes'), categories=load('value_type_categories')),
+        'timestamp': load('timestamp'),
+        'value': load('value')
+    })
+
+def load_dataset(path: str) -> pd.DataFrame:
+    """
+    Lädt einen Datensatz (node_name, value_type, timestamp, value) aus einer CSV-Datei.
+
+    Die CSV-Datei wird nur gelesen, wenn kein aktueller Cache existiert. Der Cache wird anhand von
+    Größe und Änderungszeitpunkt der Quelldatei invalidiert.
+    """
+
+    signature = source_signature(path)
+    cache_path = os.path.join(CACHE_DIR, os.path.splitext(os.path.basename(path))[0])
+
+    df = read_cache(cache_path, signature)
+
+    if df is None:
+        df = pd.read_csv(path)
+        write_cache(df, cache_path, signature)
+        df = read_cache(cache_path, signature)
+
+    return df
@@ -1,5 +1,10 @@
+import os
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+import concurrent.futures
+from dataset_cache import load_dataset
+from streaming import normalize_csv_stream
 
 def normalize_data(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -15,45 +20,32 @@ def normalize_data(df: pd.DataFrame) -> pd.DataFrame:
     # Spalte für relative Zeit in 5 Minuten Intervallen hinzufügen
     df['relative_time_5min'] = (df['relative_time_minutes'] // 5) * 5
 
-    # Entferne Duplikate, behalte jeweils nur den letzten Wert
+    # Entferne Duplikate, behalte jeweils nur den letzten Wert je Node, Intervall und Werttyp
     df = df.drop_duplicates(subset=['node_name', 'relative_time_5min', 'value_type'], keep='last')
 
-    # Fehlende Werte mit Forward-Fill und Backward-Fill auffüllen
-    df['value'] = df['value'].ffill().bfill()
+    # Matrix der MOER- und POWER-Werte (Zeitintervall x Node)
+    moer_matrix = df[df['value_type'] == 'MOER'].pivot(index='relative_time_5min', columns='node_name', values='value')
+    power_matrix = df[df['value_type'] == 'POWER'].pivot(index='relative_time_5min', columns='node_name', values='value')
 
-    # Filtere den Datensatz nach POWER und MOER Werten
-    power_df = df[df['value_type'] == 'POWER']
-    moer_df = df[df['value_type'] == 'MOER']
-
-    # When wir keine POWER-Werte haben, füllen wir sie mit 1 auf
+    # POWER-Werte auf dieselben Intervalle und Nodes ausrichten und je Node mit dem letzten bekannten Zustand auffüllen
     # Wir gehen davon aus, dass ein Node, der Werte erzeugt, läuft falls nicht anderweitig angegeben
-    if power_df.empty:
-        power_df = moer_df.copy()
-        power_df['value_type'] = 'POWER'
-        power_df['value'] = 1
-    
-    # Führe die beiden DataFrames zusammen und berechne das Produkt der Werte
-    df = pd.merge(power_df, moer_df, on=['relative_time_5min'], suffixes=('_power', '_moer'))
-    df['total_moer'] = df['value_power'] * df['value_moer']
+    power_matrix = power_matrix.reindex(index=moer_matrix.index.union(power_matrix.index), columns=moer_matrix.columns)
+    power_matrix = power_matrix.ffill().fillna(1).reindex(moer_matrix.index)
 
-    # Summiere total_moer
-    df = df.groupby(['relative_time_5min'])['total_moer'].sum().reset_index()
+    # Produkt aus POWER und MOER je Node, summiert über alle Nodes eines Intervalls
+    df = (moer_matrix * power_matrix).sum(axis=1).rename('total_moer').reset_index()
     
     # Kumulative Summe der CO2-Emissionen berechnen
     df['cumulative_total_moer'] = df['total_moer'].cumsum()
 
     return df
 
-def plot(input_name: str, output_name: str, max_minutes: int, time_label: str) -> None:
+def plot(df_with_operator: pd.DataFrame, df_without_operator: pd.DataFrame, output_name: str, max_minutes: int, time_label: str) -> None:
     """
     Plottet das Produkt aus Power und MOER Werten für alle Knoten über die Zeit.
-    """
-
-    # df_with_operator = normalize_data(pd.read_csv('datasets/20240714_node_metric_entries_more_fluct.csv'))
-    # df_without_operator = normalize_data(pd.read_csv('datasets/20240714_node_metric_entries_more_fluct_without_operator.csv'))
 
-    df_with_operator = normalize_data(pd.read_csv(f'datasets/{input_name}-cluster_with-operator.csv'))
-    df_without_operator = normalize_data(pd.read_csv(f'datasets/{input_name}-cluster_without-operator.csv'))
+    Erwartet die bereits mit normalize_data() aufbereiteten Datensätze und schneidet daraus das Zeitfenster aus.
+    """
 
     # Betrachte nur die kleinste, gemeinsame Zeit der beiden Datensätze limitiert durch max_minutes
     max_time = min(df_with_operator['relative_time_5min'].max(), df_without_operator['relative_time_5min'].max(), max_minutes)
@@ -65,6 +57,9 @@ def plot(input_name: str, output_name: str, max_minutes: int, time_label: str) -
     
     # Prozentuale Differenz der CO2-Emissionsraten für jeden Datenpunkt berechnen
     merged_df['percentage_difference'] = ((merged_df['total_moer_without'] - merged_df['total_moer_with']) / merged_df['total_moer_with']) * 100
+
+    # Intervalle, in denen mit Operator nur ausgeschaltete Nodes Werte gemeldet haben, ergeben keine endliche Differenz
+    merged_df = merged_df[np.isfinite(merged_df['percentage_difference'])]
     
     # Median und Mean der prozentualen Differenzen berechnen
     median_percentage_difference = abs(merged_df['percentage_difference'].median())
@@ -101,10 +96,49 @@ def plot(input_name: str, output_name: str, max_minutes: int, time_label: str) -
     plt.savefig(f'datasets/plots/{output_name}_hist.png')
     plt.close()
 
-plot(input_name= 'test', output_name= 'test_7d', max_minutes= 7 * 24 * 60, time_label= ' (7 Days)')
-plot(input_name= 'test', output_name= 'test_2d', max_minutes= 2 * 24 * 60, time_label= ' (2 Days)')
-plot(input_name= 'test', output_name= 'test_2h', max_minutes= 2 * 60, time_label= ' (2 Hours)')
+# Zeitfenster, die für jeden Datensatz geplottet werden (Ausgabename, maximale Minuten, Beschriftung)
+windows = [
+    ('7d', 7 * 24 * 60, ' (7 Days)'),
+    ('2d', 2 * 24 * 60, ' (2 Days)'),
+    ('2h', 2 * 60, ' (2 Hours)'),
+]
+
+def load_normalized(path: str, chunksize: int = None) -> pd.DataFrame:
+    """
+    Lädt und bereitet einen Datensatz auf, bei gesetzter chunksize blockweise mit begrenztem Speicherbedarf.
+    """
+
+    if chunksize:
+        return normalize_csv_stream(path, chunksize)
+
+    return normalize_data(load_dataset(path))
+
+if __name__ == '__main__':
+    input_names = ['test', 'prod']
+
+    # Große Exporte können mit PLOT_CHUNKSIZE blockweise gelesen werden, statt sie vollständig zu laden
+    chunksize = int(os.getenv('PLOT_CHUNKSIZE', '0'))
+
+    # Die Diagramme werden parallel in eigenen Prozessen erstellt, während die nächsten Datensätze geladen werden
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        futures = []
+
+        for input_name in input_names:
+            # Jeder Datensatz wird genau einmal gelesen und aufbereitet, die Zeitfenster werden daraus ausgeschnitten
+            # df_with_operator = normalize_data(load_dataset('datasets/20240714_node_metric_entries_more_fluct.csv'))
+            # df_without_operator = normalize_data(load_dataset('datasets/20240714_node_metric_entries_more_fluct_without_operator.csv'))
+            try:
+                df_with_operator = load_normalized(f'datasets/{input_name}-cluster_with-operator.csv', chunksize)
+                df_without_operator = load_normalized(f'datasets/{input_name}-cluster_without-operator.csv', chunksize)
+            except FileNotFoundError as e:
+                # Ein fehlender Datensatz verhindert nicht die Diagramme der übrigen Datensätze
+                print(f'Skipping {input_name}: {e.filename} not found')
+                continue
+
+            futures += [
+                executor.submit(plot, df_with_operator, df_without_operator, output_name=f'{input_name}_{window_name}', max_minutes=max_minutes, time_label=time_label)
+                for window_name, max_minutes, time_label in windows
+            ]
 
-plot(input_name= 'prod', output_name= 'prod_7d', max_minutes= 7 * 24 * 60, time_label= ' (7 Days)')
-plot(input_name= 'prod', output_name= 'prod_2d', max_minutes= 2 * 24 * 60, time_label= ' (2 Days)')
-plot(input_name= 'prod', output_name= 'prod_2h', max_minutes= 2 * 60, time_label= ' (2 Hours)')
+        for future in futures:
+            future.result()
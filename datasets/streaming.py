@@ -0,0 +1,121 @@
+import pandas as pd
+
+# Anzahl der Zeilen, die pro Block gelesen werden
+DEFAULT_CHUNKSIZE = 500_000
+
+def aggregate_buckets(df: pd.DataFrame, power_state: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Berechnet total_moer für vollständige 5-Minuten-Intervalle eines Blocks.
+
+    power_state enthält den letzten bekannten POWER-Wert je Node aus den vorherigen Blöcken.
+    Gibt (total_moer je Intervall, aktualisierter POWER-Zustand je Node) zurück.
+    """
+
+    # Entferne Duplikate, behalte jeweils nur den letzten Wert je Node, Intervall und Werttyp
+    df = df.drop_duplicates(subset=['node_name', 'relative_time_5min', 'value_type'], keep='last')
+
+    # Matrix der MOER- und POWER-Werte (Zeitintervall x Node)
+    moer_matrix = df[df['value_type'] == 'MOER'].pivot(index='relative_time_5min', columns='node_name', values='value')
+    power_matrix = df[df['value_type'] == 'POWER'].pivot(index='relative_time_5min', columns='node_name', values='value')
+
+    # Der Zustand aus den vorherigen Blöcken wird als erste Zeile vorangestellt und je Node fortgeschrieben
+    columns = moer_matrix.columns.union(power_matrix.columns).union(power_state.index)
+    carried = pd.DataFrame([power_state.reindex(columns)], index=[float('-inf')])
+    power_matrix = pd.concat([carried, power_matrix.reindex(columns=columns)])
+    power_matrix = power_matrix.reindex(index=power_matrix.index.union(moer_matrix.index)).ffill()
+
+    # Letzter bekannter POWER-Wert je Node für den nächsten Block
+    power_state = power_matrix.iloc[-1].dropna()
+
+    # Wir gehen davon aus, dass ein Node, der Werte erzeugt, läuft falls nicht anderweitig angegeben
+    power_matrix = power_matrix.fillna(1).reindex(index=moer_matrix.index, columns=moer_matrix.columns)
+
+    return (moer_matrix * power_matrix).sum(axis=1), power_state
+
+def normalize_stream(chunks, start_time: pd.Timestamp) -> pd.DataFrame:
+    """
+    Bereitet einen blockweise gelesenen Datensatz wie normalize_data() auf, ohne ihn vollständig im Speicher zu halten.
+
+    Die Blöcke müssen chronologisch sortiert sein. start_time ist der früheste Zeitstempel des gesamten Datensatzes.
+    Im Speicher werden nur der aktuelle Block, das noch offene Intervall, der POWER-Zustand je Node und
+    die Summe je Intervall gehalten.
+    """
+
+    totals = []
+    power_state = pd.Series(dtype=float)
+    pending = None
+
+    for chunk in chunks:
+        chunk = chunk.copy()
+
+        # Spalte für relative Zeit in 5 Minuten Intervallen hinzufügen, berechnet wie in normalize_data()
+        chunk['timestamp'] = pd.to_datetime(chunk['timestamp'])
+        relative_time_minutes = (chunk['timestamp'] - start_time).dt.total_seconds() / 60
+        chunk['relative_time_5min'] = (relative_time_minutes // 5) * 5
+
+        if chunk.empty:
+            continue
+
+        if pending is not None:
+            if chunk['relative_time_5min'].min() < pending['relative_time_5min'].iloc[0]:
+                raise ValueError('Streaming aggregation requires chronologically sorted input')
+
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+
+        # Das letzte Intervall kann im nächsten Block fortgesetzt werden und bleibt daher offen
+        last_bucket = chunk['relative_time_5min'].max()
+        pending = chunk[chunk['relative_time_5min'] == last_bucket]
+        complete = chunk[chunk['relative_time_5min'] < last_bucket]
+
+        if not complete.empty:
+            total_moer, power_state = aggregate_buckets(complete, power_state)
+            totals.append(total_moer)
+
+    if pending is not None:
+        total_moer, power_state = aggregate_buckets(pending, power_state)
+        totals.append(total_moer)
+
+    if not totals:
+        return pd.DataFrame({'relative_time_5min': [], 'total_moer': [], 'cumulative_total_moer': []})
+
+    df = pd.concat(totals).rename('total_moer').rename_axis('relative_time_5min').reset_index()
+
+    # Kumulative Summe der CO2-Emissionen berechnen
+    df['cumulative_total_moer'] = df['total_moer'].cumsum()
+
+    return df
+
+def normalize_csv_stream(path: str, chunksize: int = DEFAULT_CHUNKSIZE) -> pd.DataFrame:
+    """
+    Liest einen exportierten Datensatz blockweise und bereitet ihn wie normalize_data() auf.
+
+    Der früheste Zeitstempel wird in einem ersten Durchlauf ermittelt, der nur die Zeitstempel-Spalte liest.
+    """
+
+    start_time = min(
+        pd.to_datetime(chunk['timestamp']).min()
+        for chunk in pd.read_csv(path, usecols=['timestamp'], chunksize=chunksize)
+    )
+
+    return normalize_stream(pd.read_csv(path, chunksize=chunksize), start_time)
+
+def normalize_postgres_stream(connection_string: str, chunksize: int = DEFAULT_CHUNKSIZE) -> pd.DataFrame:
+    """
+    Liest node_metric_entries direkt aus Postgres über einen serverseitigen Cursor und bereitet sie wie normalize_data() auf.
+    """
+
+    import psycopg
+
+    with psycopg.connect(connection_string) as db:
+        start_time, = db.execute('SELECT min(timestamp) FROM node_metric_entries').fetchone()
+
+        def chunks():
+            # Ein benannter Cursor überträgt die Zeilen blockweise, statt das gesamte Ergebnis zu laden
+            with db.cursor(name='node_metric_entries_stream') as cursor:
+                cursor.itersize = chunksize
+                cursor.execute('SELECT node_name, value_type::text, timestamp, value FROM node_metric_entries ORDER BY timestamp')
+
+                while rows := cursor.fetchmany(chunksize):
+                    yield pd.DataFrame(rows, columns=['node_name', 'value_type', 'timestamp', 'value'])
+
+        return normalize_stream(chunks(), pd.Timestamp(start_time))